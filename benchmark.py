@@ -0,0 +1,465 @@
+"""
+Benchmark das etapas da conciliação com dados sintéticos
+
+Gera arquivos Excel realistas de cada formato (SICOOB com descrições em várias linhas
+e sufixos C/D, Banco do Brasil, Extrato Padrão e Controle Perfarm com "-R$ 1.234,56")
+nos tamanhos pedidos e mede o tempo de cada etapa, na ordem do tratamento em produção:
+leitura, agrupar_linhas_extrato, etapas de formatos.etapas_tratamento (datas, filtro,
+conversão dos valores), juntar_blocos, compactar_colunas, ordernar_arquivo, parear_conciliacao,
+tabela_conciliacao, criar_relatorio_conciliação e exportar_relatorio_excel. Inclui também casos
+adversariais para os motores de pareamento, como milhares de valores idênticos
+sem contrapartida.
+
+Com --memoria, verifica em 500 mil movimentos a memória por linha da ingestão (pico das
+etapas em blocos até o DataFrame tratado, e o tratado resultante) e o pico do pareamento
+e da conciliacao_simples, falhando (código 1) acima dos limites. Os picos contam as
+alocações do Python/NumPy (tracemalloc) e as do Arrow (textos do pandas 3).
+
+Uso:
+    python benchmark.py [--tamanhos 1000 10000 100000 1000000] [--formatos ...]
+        [--pasta .benchmark] [--saida resultados.csv] [--sem-adversariais]
+    python benchmark.py --memoria [--tamanho-memoria 500000]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import formatos
+import funcoes_especificas as func
+import relatorio as r
+
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000, 1_000_000]
+FORMATO_CONTROLE = "Controle Financeiro Perfarm"
+
+HISTORICOS = ['PIX RECEBIDO', 'PIX EMITIDO', 'TED RECEBIDA', 'DÉB. TÍTULO', 'TARIFA PACOTE',
+              'CRÉD. COBRANÇA', 'DÉB. CONVÊNIO', 'TRANSF. ENTRE CONTAS']
+CONTRAPARTES = [f'FORNECEDOR {i:03d}' for i in range(200)] + [f'CLIENTE {i:03d}' for i in range(300)]
+PLANOS = ['RECEITA DE VENDAS', 'INSUMOS', 'COMBUSTÍVEL', 'MANUTENÇÃO', 'FOLHA', 'TARIFAS BANCÁRIAS',
+          'IMPOSTOS', 'ARRENDAMENTO']
+
+
+# Geração dos dados sintéticos
+
+def gerar_movimentos(n, semente=0):
+    """
+    Movimentos "verdadeiros" da conta, base para o extrato e para o controle
+    Valores em centavos com cauda longa e muitos valores repetidos (tarifas, parcelas)
+    """
+    rng = np.random.default_rng(semente)
+    centavos = np.round(rng.lognormal(8, 1.5, n)).astype('int64') + 1
+    repetidos = rng.random(n) < 0.2
+    centavos[repetidos] = rng.choice([1_500, 4_990, 10_000, 25_000], repetidos.sum())
+    sinal = np.where(rng.random(n) < 0.45, 1, -1)
+    return pd.DataFrame({
+        'data': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 365, n)), unit='D'),
+        'documento': rng.integers(100_000, 999_999, n),
+        'historico': rng.choice(HISTORICOS, n),
+        'contraparte': rng.choice(CONTRAPARTES, n),
+        'plano': rng.choice(PLANOS, n),
+        'centavos': centavos * sinal,
+    })
+
+
+def valor_br(centavos, sufixo=False, moeda=False):
+    """Formata centavos no padrão brasileiro: '1.234,56', '1.234,56 D', '-R$ 1.234,56'"""
+    reais, resto = divmod(abs(int(centavos)), 100)
+    texto = f"{reais:,}".replace(',', '.') + f",{resto:02d}"
+    if sufixo:
+        return f"{texto} {'D' if centavos < 0 else 'C'}"
+    if moeda:
+        return f"{'-' if centavos < 0 else ''}R$ {texto}"
+    return f"{'-' if centavos < 0 else ''}{texto}"
+
+
+def _linhas_sicoob(mov, rng):
+    """Extrato SICOOB: descrição continuada em linhas sem data e linhas de saldo do dia"""
+    yield ["EXTRATO CONTA CORRENTE", None, None, None]
+    yield ["DATA", "DOCUMENTO", "HISTÓRICO", "VALOR"]
+    continuacoes = rng.integers(0, 3, len(mov))
+    dia_anterior = None
+    for linha, extra in zip(mov.itertuples(index=False), continuacoes):
+        data = linha.data.strftime('%d/%m/%Y')
+        if dia_anterior is not None and data != dia_anterior:
+            yield [dia_anterior, None, "SALDO DO DIA", None]
+        dia_anterior = data
+        yield [data, str(linha.documento), linha.historico, valor_br(linha.centavos, sufixo=True)]
+        for i in range(extra):
+            yield [None, None, linha.contraparte if i == 0 else f"DOC {linha.documento}", None]
+
+
+def _linhas_bb(mov, rng):
+    """Extrato Banco do Brasil: valores numéricos, lançamento + detalhes"""
+    yield ["Data", "Lançamento", "Detalhes", "N° documento", "Valor", "Tipo Lançamento"]
+    yield [mov['data'].iloc[0].strftime('%d/%m/%Y') if len(mov) else None, "Saldo Anterior", None, None, 0.0, None]
+    for linha in mov.itertuples(index=False):
+        yield [linha.data.strftime('%d/%m/%Y'), linha.historico, linha.contraparte, linha.documento,
+               linha.centavos / 100, 'Entrada' if linha.centavos > 0 else 'Saída']
+
+
+def _linhas_padrao(mov, rng):
+    """Extrato Padrão: valores em texto com sinal"""
+    yield ["DATA", "DOCUMENTO", "DESCRIÇÃO", "INFORMAÇÕES ADICIONAIS", "VALOR"]
+    for linha in mov.itertuples(index=False):
+        yield [linha.data.to_pydatetime(), str(linha.documento), linha.historico, linha.contraparte, valor_br(linha.centavos)]
+
+
+def _linhas_perfarm(mov, rng):
+    """Controle Perfarm: cabeçalho na 6ª linha e valores '-R$ 1.234,56'"""
+    yield ["Relatório de Movimentações"]
+    for _ in range(4):
+        yield []
+    yield ["Data", "Recurso", "Contraparte", "Plano de Contas", "Valor", "Conta"]
+    for linha in mov.itertuples(index=False):
+        yield [linha.data.strftime('%d/%m/%Y'), linha.historico, linha.contraparte, linha.plano,
+               valor_br(linha.centavos, moeda=True), "CONTA MOVIMENTO"]
+
+
+GERADORES = {
+    "SICOOB": _linhas_sicoob,
+    "Banco do Brasil": _linhas_bb,
+    "Extrato Padrão": _linhas_padrao,
+    FORMATO_CONTROLE: _linhas_perfarm,
+}
+
+
+def gravar_excel(caminho, linhas):
+    """Grava as linhas em um xlsx com o openpyxl em modo write-only (rápido para arquivos grandes)"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    for linha in linhas:
+        worksheet.append(linha)
+    workbook.save(caminho)
+
+
+def gerar_arquivos(n, pasta, semente=0):
+    """
+    Gera (ou reaproveita) os arquivos de todos os formatos com n movimentos
+    O controle tem ~90% dos movimentos do extrato e ~5% de lançamentos só dele
+
+    Returns:
+        dict: formato -> caminho do arquivo
+    """
+    os.makedirs(pasta, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    mov = gerar_movimentos(n, semente)
+    presentes = rng.random(n) < 0.9
+    extras = gerar_movimentos(max(n // 20, 1), semente + 1)
+    mov_controle = pd.concat([mov[presentes], extras]).sort_values('data', kind='stable')
+
+    caminhos = {}
+    for nome_formato, gerador in GERADORES.items():
+        caminho = os.path.join(pasta, f"{nome_formato.replace(' ', '_')}_{n}.xlsx")
+        if not os.path.exists(caminho):
+            base = mov_controle if nome_formato == FORMATO_CONTROLE else mov
+            gravar_excel(caminho, gerador(base, np.random.default_rng(semente)))
+        caminhos[nome_formato] = caminho
+    return caminhos
+
+
+# Medição das etapas
+
+def medir(medicoes, formato, tamanho, etapa, funcao, *args, **kwargs):
+    """Executa uma etapa e registra o tempo e o número de linhas do resultado"""
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    tempo = time.perf_counter() - inicio
+    saida = resultado[0] if isinstance(resultado, tuple) else resultado
+    medicoes.append({
+        'formato': formato, 'tamanho': tamanho, 'etapa': etapa, 'segundos': tempo,
+        'linhas': len(saida) if isinstance(saida, pd.DataFrame) else None,
+    })
+    return resultado
+
+
+def medir_etapas(caminho, nome_formato, n, df_controle=None):
+    """
+    Mede cada etapa isoladamente sobre o arquivo inteiro, na ordem de
+    formatos.tratar_blocos_formato (agrupamento, etapas_tratamento do formato, junção,
+    colunas categóricas e ordenação), e o ler_arquivo completo (em blocos) para comparação
+
+    Returns:
+        tuple: (lista de medições, DataFrame tratado)
+    """
+    formato = formatos.obter_formato(nome_formato)
+    medicoes = []
+
+    def cron(etapa, funcao, *args, **kwargs):
+        return medir(medicoes, nome_formato, n, etapa, funcao, *args, **kwargs)
+
+    df = cron('leitura', lambda: func.juntar_blocos(formatos.ler_blocos(caminho, nome_formato)))
+    if formato['agrupar_continuacao']:
+        df = cron('agrupar_linhas_extrato', func.agrupar_linhas_extrato, df)
+    for etapa in formatos.etapas_tratamento(nome_formato):
+        df = cron(getattr(etapa, 'func', etapa).__name__, etapa, df)
+    # O arquivo inteiro como um único bloco: a junção refaz o índice após o filtro
+    df = cron('juntar_blocos', func.juntar_blocos, [df])
+    df = cron('compactar_colunas', func.compactar_colunas, df)
+    if formato['ordenar']:
+        df = cron('ordernar_arquivo', func.ordernar_arquivo, df)
+    cron('ler_arquivo (completo)', formatos.ler_arquivo, caminho, nome_formato)
+
+    if df_controle is not None:
+        resultado = cron('parear_conciliacao', func.parear_conciliacao, df, df_controle)
+        cron('tabela_conciliacao', func.tabela_conciliacao, resultado)
+        mov_e, total_e = func.contar_movimentacoes(df)
+        mov_c, total_c = func.contar_movimentacoes(df_controle)
+        relatorio = cron(
+            'criar_relatorio_conciliação', r.criar_relatorio_conciliação,
+            resultado, 0, mov_e, mov_c, total_e, total_c, total_e, total_c, 'Benchmark'
+        )
+        cron('exportar_relatorio_excel', r.exportar_relatorio_excel, relatorio)
+
+    return medicoes, df
+
+
+def movimentacoes_sinteticas(valores_centavos, prefixo):
+    """DataFrame no formato da conciliação direto dos valores (sem passar por arquivo)"""
+    n = len(valores_centavos)
+    return pd.DataFrame({
+        'data': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n) % 28, unit='D'),
+        'documento': [f'{prefixo}{i}' for i in range(n)],
+        'descricao': [f'LANÇAMENTO {prefixo} {i % 50}' for i in range(n)],
+        'contraparte': 'CONTRAPARTE',
+        'plano de contas': 'PLANO',
+        'valor_centavos': pd.array(valores_centavos, dtype='Int64'),
+    })
+
+
+def casos_adversariais(n=5_000):
+    """
+    Casos difíceis para os motores de pareamento:
+    - milhares de valores idênticos sem contrapartida do outro lado
+    - milhares de valores idênticos dos dois lados (desempate por texto)
+    - sobras que só fecham em grupo (segunda passada agrupada com limite de tempo)
+    """
+    identicos_e = movimentacoes_sinteticas(np.full(n, 10_000), 'E')
+    sem_par_c = movimentacoes_sinteticas(np.full(n, 20_000), 'C')
+    identicos_c = movimentacoes_sinteticas(np.full(n, 10_000), 'C')
+    pequenos_e = movimentacoes_sinteticas(np.random.default_rng(0).integers(1, 50, n) * 100, 'E')
+    somas_c = movimentacoes_sinteticas(np.full(n // 10, 99_900), 'C')
+
+    return [
+        ("valores idênticos sem contrapartida", identicos_e, sem_par_c, {}),
+        ("valores idênticos sem contrapartida (texto)", identicos_e, sem_par_c, {'motor': 'texto'}),
+        ("valores idênticos dos dois lados", identicos_e, identicos_c, {}),
+        ("valores idênticos dos dois lados (texto)", identicos_e, identicos_c, {'motor': 'texto'}),
+        ("valores idênticos com janela de datas", identicos_e, identicos_c, {'janela_dias': 3}),
+        ("sobras sem par com agrupamento", identicos_e, sem_par_c, {'agrupar': True}),
+        ("grupos de valores pequenos", pequenos_e, somas_c, {'agrupar': True}),
+    ]
+
+
+def medir_adversariais(n=5_000):
+    medicoes = []
+    for nome, df_e, df_c, opcoes in casos_adversariais(n):
+        medir(medicoes, 'adversarial', n, nome, func.conciliacao_simples, df_e, df_c, **opcoes)
+    return medicoes
+
+
+# Verificação da memória por linha
+
+TAMANHO_MEMORIA = 500_000
+
+# Formatos cuja ingestão é medida (o SICOOB passa pelo agrupamento das linhas de continuação)
+FORMATOS_MEMORIA = {'extrato': 'SICOOB', 'controle': FORMATO_CONTROLE}
+
+# Limites em bytes por linha (movimento); acima deles a verificação falha
+# Os picos somam o do tracemalloc e o do pool de memória do Arrow (ver _medir_pico)
+LIMITES_MEMORIA_POR_LINHA = {
+    'extrato tratado': 80,
+    'controle tratado': 60,
+    'ingestão extrato (pico)': 180,
+    'ingestão controle (pico)': 190,
+    'parear_conciliacao (pico)': 220,
+    'conciliacao_simples (pico)': 250,
+}
+
+
+def tratados_sinteticos(n, semente=0):
+    """
+    Extrato e controle como saem de formatos.ler_arquivo (mesmas colunas e tipos),
+    montados direto dos movimentos, sem passar por arquivo Excel
+    """
+    mov = gerar_movimentos(n, semente)
+    valores = pd.array(mov['centavos'], dtype='Int64')
+    extrato = pd.DataFrame({
+        'data': mov['data'],
+        'documento': mov['documento'].astype(str),
+        'descricao': mov['historico'] + ' ' + mov['contraparte'],
+        'valor_centavos': valores,
+    })
+    controle = func.compactar_colunas(pd.DataFrame({
+        'data': mov['data'],
+        'descricao': mov['historico'],
+        'contraparte': mov['contraparte'],
+        'plano de contas': mov['plano'],
+        'valor_centavos': valores,
+    }))
+    return extrato, controle
+
+
+def _preparar_ingestao(nome_formato):
+    """
+    Ingestão do formato pelo mesmo caminho do ler_arquivo (blocos_de_linhas e
+    tratar_blocos_formato), a partir das linhas do gerador em vez do arquivo Excel
+    """
+    def preparar(n, semente):
+        linhas = list(GERADORES[nome_formato](gerar_movimentos(n, semente), np.random.default_rng(semente)))
+        return lambda: formatos.tratar_blocos_formato(formatos.blocos_de_linhas(linhas, nome_formato), nome_formato)
+    return preparar
+
+
+def _preparar_pareamento(funcao):
+    def preparar(n, semente):
+        extrato, controle = tratados_sinteticos(n, semente)
+        return lambda: funcao(extrato, controle)
+    return preparar
+
+
+MEDIDAS_PICO = {
+    **{f'ingestão {lado}': _preparar_ingestao(nome_formato) for lado, nome_formato in FORMATOS_MEMORIA.items()},
+    'parear_conciliacao': _preparar_pareamento(func.parear_conciliacao),
+    'conciliacao_simples': _preparar_pareamento(func.conciliacao_simples),
+}
+
+
+def _pool_arrow_medicao(pa):
+    """Pool do Arrow reservado à etapa medida (mimalloc ou jemalloc, conforme a compilação)"""
+    for criar in (pa.mimalloc_memory_pool, pa.jemalloc_memory_pool):
+        try:
+            return criar()
+        except NotImplementedError:
+            continue
+    return None
+
+
+def _medir_pico(medida, n, semente=0):
+    """
+    Executa uma medida de MEDIDAS_PICO, em um processo novo: prepara as entradas fora
+    da medição e mede o pico da etapa no tracemalloc (alocações do Python e do NumPy)
+    e no pool do Arrow, onde ficam as colunas de texto do pandas 3 e que o tracemalloc
+    não enxerga. O pico do pool não pode ser zerado: o processo usa o pool do sistema
+    até a etapa e um pool reservado (ainda sem uso) durante ela
+    A soma dos dois picos é um limite superior: eles podem não ocorrer juntos
+
+    Returns:
+        dict: picos 'python' e 'arrow' (bytes; arrow None se não medido) e, para as
+        ingestões, 'tratado' (memory_usage profundo do DataFrame tratado)
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pa = None
+    if pa is not None:
+        pa.set_memory_pool(pa.system_memory_pool())
+    executar = MEDIDAS_PICO[medida](n, semente)
+
+    pool = _pool_arrow_medicao(pa) if pa is not None else None
+    if pool is not None:
+        pa.set_memory_pool(pool)
+    tracemalloc.start()
+    try:
+        saida = executar()
+        pico_python = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'python': pico_python,
+        'arrow': pool.max_memory() if pool is not None else (0 if pa is None else None),
+        'tratado': saida.memory_usage(deep=True).sum() if medida.startswith('ingestão') else None,
+    }
+
+
+def _em_processo_novo(funcao, *args):
+    """Executa a função em um processo novo (spawn), sem herdar a memória deste"""
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+        return executor.submit(funcao, *args).result()
+
+
+def verificar_memoria_por_linha(n=TAMANHO_MEMORIA):
+    """
+    Mede, por movimento, o pico da ingestão de cada lado (das linhas da planilha ao
+    DataFrame tratado) e os bytes do DataFrame tratado resultante (memory_usage
+    profundo), e o pico do pareamento compacto e da conciliacao_simples completa,
+    e compara com LIMITES_MEMORIA_POR_LINHA
+    Cada pico é medido em um processo novo (ver _medir_pico)
+
+    Returns:
+        list: uma medição por item, com o limite e se foi respeitado
+    """
+    medicoes = []
+
+    def registrar(medida, total, pico=None):
+        valor = total / n
+        medicoes.append({
+            'medida': medida, 'tamanho': n, 'bytes_por_linha': round(valor, 1),
+            'python': None if pico is None else round(pico['python'] / n, 1),
+            'arrow': None if pico is None or pico['arrow'] is None else round(pico['arrow'] / n, 1),
+            'limite': LIMITES_MEMORIA_POR_LINHA[medida], 'ok': valor <= LIMITES_MEMORIA_POR_LINHA[medida],
+        })
+
+    for lado in FORMATOS_MEMORIA:
+        pico = _em_processo_novo(_medir_pico, f'ingestão {lado}', n)
+        registrar(f'{lado} tratado', pico['tratado'])
+        registrar(f'ingestão {lado} (pico)', pico['python'] + (pico['arrow'] or 0), pico)
+    for etapa in ('parear_conciliacao', 'conciliacao_simples'):
+        pico = _em_processo_novo(_medir_pico, etapa, n)
+        registrar(f'{etapa} (pico)', pico['python'] + (pico['arrow'] or 0), pico)
+    return medicoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das etapas da conciliação")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    parser.add_argument('--formatos', nargs='+', default=list(formatos.FORMATOS_EXTRATO), choices=list(formatos.FORMATOS_EXTRATO))
+    parser.add_argument('--pasta', default='.benchmark', help="pasta dos arquivos gerados (reaproveitados entre execuções)")
+    parser.add_argument('--saida', default=None, help="CSV com todas as medições")
+    parser.add_argument('--sem-adversariais', action='store_true')
+    parser.add_argument('--tamanho-adversarial', type=int, default=5_000)
+    parser.add_argument('--memoria', action='store_true', help="apenas a verificação da memória por linha")
+    parser.add_argument('--tamanho-memoria', type=int, default=TAMANHO_MEMORIA)
+    args = parser.parse_args(argv)
+
+    if args.memoria:
+        verificacao = pd.DataFrame(verificar_memoria_por_linha(args.tamanho_memoria))
+        print(verificacao.to_string(index=False))
+        return 0 if verificacao['ok'].all() else 1
+
+    medicoes = []
+    for n in args.tamanhos:
+        inicio = time.perf_counter()
+        caminhos = gerar_arquivos(n, args.pasta)
+        print(f"Arquivos de {n} movimentos prontos ({time.perf_counter() - inicio:.1f}s)", flush=True)
+
+        medicoes_controle, df_controle = medir_etapas(caminhos[FORMATO_CONTROLE], FORMATO_CONTROLE, n)
+        medicoes += medicoes_controle
+        for nome_formato in args.formatos:
+            medicoes_formato, _ = medir_etapas(caminhos[nome_formato], nome_formato, n, df_controle)
+            medicoes += medicoes_formato
+
+    if not args.sem_adversariais:
+        medicoes += medir_adversariais(args.tamanho_adversarial)
+
+    tabela = pd.DataFrame(medicoes)
+    tabela['linhas'] = tabela['linhas'].astype('Int64')
+    tabela['linhas_por_segundo'] = (tabela['linhas'] / tabela['segundos']).round().astype('Int64')
+    print()
+    print(tabela.to_string(index=False, float_format=lambda t: f"{t:.3f}"))
+    if args.saida:
+        tabela.to_csv(args.saida, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Comparação diferencial entre os motores de conciliação
+
+Gera extratos e controles aleatórios (valores repetidos, negativos, lados vazios),
+roda o motor de referência ('laco', o laço original da conciliacao_simples) e o
+motor avaliado sobre as mesmas entradas, compara os resultados célula a célula e
+informa a razão de velocidade. Um motor novo só deve virar o padrão da
+conciliacao_simples se passar por aqui sem divergências. O motor da janela de
+datas é verificado à parte (verificar_janela_datas), por casos fixos e invariantes.
+
+Uso:
+    python comparacao_motores.py [motor] [--casos N] [--semente S] [--tamanho N]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import funcoes_especificas as func
+import funcoes_deletadas as deletadas
+
+MOTOR_REFERENCIA = 'laco'
+
+
+def gerar_movimentacoes(rng, n, faixa_valores, prefixo):
+    """
+    Gera um DataFrame de movimentações no formato usado pela conciliação
+    Uma faixa de valores pequena força muitos valores repetidos
+    """
+    centavos = rng.integers(-faixa_valores, faixa_valores + 1, n) * 100
+    dias = rng.integers(0, 60, n)
+    return pd.DataFrame({
+        'data': pd.Timestamp('2024-01-01') + pd.to_timedelta(dias, unit='D'),
+        'documento': [f'{prefixo}{i}' for i in range(n)],
+        'descricao': rng.choice(['PIX RECEBIDO', 'TED ENVIADA', 'TARIFA', 'BOLETO'], n),
+        'contraparte': rng.choice(['FULANO', 'CICLANO', None], n),
+        'plano de contas': rng.choice(['RECEITA', 'DESPESA'], n),
+        'valor_centavos': pd.array(centavos, dtype='Int64'),
+    })
+
+
+def gerar_casos(quantidade, semente=0):
+    """
+    Gera pares (extrato, controle) aleatórios
+    Inclui lados vazios e casos com poucos valores distintos (duplicados pesados)
+    """
+    rng = np.random.default_rng(semente)
+    casos = [
+        (gerar_movimentacoes(rng, 0, 5, 'E'), gerar_movimentacoes(rng, 0, 5, 'C')),
+        (gerar_movimentacoes(rng, 10, 5, 'E'), gerar_movimentacoes(rng, 0, 5, 'C')),
+        (gerar_movimentacoes(rng, 0, 5, 'E'), gerar_movimentacoes(rng, 10, 5, 'C')),
+    ]
+    while len(casos) < quantidade:
+        faixa = int(rng.choice([1, 3, 10, 1000]))
+        casos.append((
+            gerar_movimentacoes(rng, int(rng.integers(0, 60)), faixa, 'E'),
+            gerar_movimentacoes(rng, int(rng.integers(0, 60)), faixa, 'C'),
+        ))
+    return casos
+
+
+def diferencas_celulas(esperado, obtido):
+    """
+    Compara dois resultados célula a célula
+
+    Returns:
+        pd.DataFrame: uma linha por célula divergente (linha, coluna, esperado, obtido)
+    """
+    if list(esperado.columns) != list(obtido.columns) or len(esperado) != len(obtido):
+        return pd.DataFrame([{
+            'linha': None, 'coluna': 'formato',
+            'esperado': f'{len(esperado)} x {list(esperado.columns)}',
+            'obtido': f'{len(obtido)} x {list(obtido.columns)}',
+        }])
+
+    esperado = esperado.reset_index(drop=True).astype(object)
+    obtido = obtido.reset_index(drop=True).astype(object)
+    iguais = (esperado == obtido) | (esperado.isna() & obtido.isna())
+    linhas, colunas = np.nonzero(~iguais.to_numpy(dtype=bool))
+    return pd.DataFrame({
+        'linha': linhas,
+        'coluna': esperado.columns[colunas],
+        'esperado': esperado.to_numpy()[linhas, colunas],
+        'obtido': obtido.to_numpy()[linhas, colunas],
+    })
+
+
+def _cronometrar(funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+
+def comparar_motor(motor, casos):
+    """
+    Roda o motor de referência e o motor avaliado nos mesmos casos (modo 1:1, só valor)
+
+    Returns:
+        dict: casos, casos_divergentes, primeira divergência e tempos totais
+    """
+    divergentes = 0
+    primeira = None
+    tempo_referencia = tempo_motor = 0.0
+    for i, (df_extrato, df_controle) in enumerate(casos):
+        esperado, t_ref = _cronometrar(func.conciliacao_simples, df_extrato, df_controle, motor=MOTOR_REFERENCIA)
+        obtido, t_motor = _cronometrar(func.conciliacao_simples, df_extrato, df_controle, motor=motor)
+        tempo_referencia += t_ref
+        tempo_motor += t_motor
+        diferencas = diferencas_celulas(esperado, obtido)
+        if not diferencas.empty:
+            divergentes += 1
+            if primeira is None:
+                primeira = (i, diferencas)
+    return {
+        'motor': motor,
+        'casos': len(casos),
+        'casos_divergentes': divergentes,
+        'primeira_divergencia': primeira,
+        'tempo_referencia': tempo_referencia,
+        'tempo_motor': tempo_motor,
+    }
+
+
+def comparar_velocidade(motor, n=3000, faixa_valores=50, semente=0):
+    """Razão de velocidade referência/motor em um caso grande com muitos valores repetidos"""
+    rng = np.random.default_rng(semente)
+    df_extrato = gerar_movimentacoes(rng, n, faixa_valores, 'E')
+    df_controle = gerar_movimentacoes(rng, n, faixa_valores, 'C')
+    _, t_ref = _cronometrar(func.conciliacao_simples, df_extrato, df_controle, motor=MOTOR_REFERENCIA)
+    _, t_motor = _cronometrar(func.conciliacao_simples, df_extrato, df_controle, motor=motor)
+    return t_ref, t_motor
+
+
+def comparar_agrupamento_extrato(quantidade=200, semente=0):
+    """
+    Compara agrupar_linhas_extrato (vetorizada) com a versão original em laço
+    em extratos SICOOB aleatórios com linhas de continuação
+
+    Returns:
+        int: número de casos divergentes
+    """
+    rng = np.random.default_rng(semente)
+    divergentes = 0
+    for _ in range(quantidade):
+        n = int(rng.integers(1, 50))
+        principal = rng.random(n) < 0.6
+        principal[0] = True
+        descricao = np.where(
+            rng.random(n) < 0.1, None,
+            np.array(['PIX', ' DOC x ', 'FULANO', '', 'TED'], dtype=object)[rng.integers(0, 5, n)]
+        )
+        descricao = np.where(principal & pd.isna(descricao), 'PRINCIPAL', descricao)
+        df = pd.DataFrame({
+            'data': np.where(principal, '05/01/2024', None),
+            'documento': np.where(principal, '123', None),
+            'descricao': descricao,
+            'valor': np.where(principal, '10,00 C', None),
+        })
+        try:
+            pd.testing.assert_frame_equal(deletadas.agrupar_linhas_extrato(df), func.agrupar_linhas_extrato(df))
+        except AssertionError:
+            divergentes += 1
+    return divergentes
+
+
+# Casos fixos da conversão de valores: (texto, centavos esperados ou None se inválido)
+CASOS_CONVERSAO = [
+    ("1.204,54 C", 120454), ("- 850,00 D", -85000), ("-R$ 497,21", -49721), ("125,50", 12550),
+    ("63.173,85 C", 6317385), ("1.234", 123400), ("1.234.567", 123456700),
+    # Ponto decimal sem vírgula, lido como o pd.to_numeric do caminho original
+    ("1234.56", 123456), ("-50.5", -5050), ("0.99", 99), ("R$ 10.00", 1000), ("1.5 D", -150),
+    ("abc", None), ("", None),
+]
+
+
+def comparar_conversao_valores(quantidade=500, semente=0):
+    """
+    Compara converter_centavos com os valores esperados de CASOS_CONVERSAO e, em
+    valores aleatórios, com as conversões originais: texto brasileiro com C/D
+    (converter_valor), "-R$ 1.234,56" (converter_valor_reais) e texto com ponto
+    decimal (pd.to_numeric, usado antes no Extrato Padrão)
+
+    Returns:
+        list: (texto, esperado, obtido) de cada caso divergente
+    """
+    textos = [texto for texto, _ in CASOS_CONVERSAO]
+    esperados = [centavos for _, centavos in CASOS_CONVERSAO]
+
+    rng = np.random.default_rng(semente)
+    for centavos in rng.integers(-10**9, 10**9, quantidade).tolist():
+        reais = centavos / 100
+        milhar = f"{abs(reais):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        brasileiro = f"{milhar} {'D' if centavos < 0 else 'C'}"
+        moeda = f"{'-' if centavos < 0 else ''}R$ {milhar}"
+        ponto = f"{reais:.2f}"
+        for texto, original in (
+            (brasileiro, deletadas.converter_valor(brasileiro)),
+            (moeda, deletadas.converter_valor_reais(moeda)),
+            (ponto, float(pd.to_numeric(ponto))),
+        ):
+            textos.append(texto)
+            esperados.append(None if original is None else int(round(original * 100)))
+
+    obtidos, _ = func.converter_centavos(pd.Series(textos, dtype=object))
+    return [
+        (texto, esperado, None if pd.isna(obtido) else int(obtido))
+        for texto, esperado, obtido in zip(textos, esperados, obtidos)
+        if (None if pd.isna(obtido) else int(obtido)) != esperado
+    ]
+
+
+# Casos fixos da janela de datas: (descrição, extrato, controle, janela_dias, pares esperados)
+# extrato e controle são listas de (dia, valor em centavos); os pares são (posição no extrato, posição no controle)
+CASOS_JANELA = [
+    ("mesmo dia antes de um anterior na janela", [(10, 150_000)], [(7, 150_000), (10, 150_000)], 3, [(0, 1)]),
+    ("data mais próxima, mesmo posterior", [(10, 150_000)], [(7, 150_000), (12, 150_000)], 3, [(0, 1)]),
+    ("cada extrato com o mais próximo", [(5, 100), (9, 100)], [(9, 100), (5, 100)], 5, [(0, 1), (1, 0)]),
+    ("fora da janela fica sem par", [(1, 100)], [(5, 100)], 3, []),
+    ("valores diferentes não pareiam", [(1, 100)], [(1, 200)], 3, []),
+]
+
+
+def _movimentacoes_janela(linhas, prefixo):
+    """DataFrame da conciliação a partir de (dia, valor em centavos)"""
+    dias = [dia for dia, _ in linhas]
+    return pd.DataFrame({
+        'data': pd.Timestamp('2024-01-01') + pd.to_timedelta(dias, unit='D'),
+        'documento': [f'{prefixo}{i}' for i in range(len(linhas))],
+        'descricao': 'LANÇAMENTO',
+        'contraparte': 'CONTRAPARTE',
+        'plano de contas': 'PLANO',
+        'valor_centavos': pd.array([valor for _, valor in linhas], dtype='Int64'),
+    })
+
+
+def _pares_janela(df_extrato, df_controle, janela_dias):
+    resultado = func.parear_conciliacao(df_extrato, df_controle, janela_dias=janela_dias)
+    return list(zip(resultado['pares']['_id_extrato'].tolist(), resultado['pares']['_id_controle'].tolist()))
+
+
+def verificar_janela_datas(quantidade=200, semente=0):
+    """
+    Verifica o motor da janela de datas: os casos fixos de CASOS_JANELA e, em casos
+    aleatórios, que todo par tem o mesmo valor e está dentro da janela, que nenhum
+    lançamento sem par do controle estava mais próximo de um extrato pareado e que
+    não sobra extrato e controle sem par de mesmo valor dentro da janela
+
+    Returns:
+        list: descrição dos casos com falha
+    """
+    falhas = []
+    for descricao, extrato, controle, janela_dias, esperado in CASOS_JANELA:
+        obtido = _pares_janela(_movimentacoes_janela(extrato, 'E'), _movimentacoes_janela(controle, 'C'), janela_dias)
+        if sorted(obtido) != sorted(esperado):
+            falhas.append(f"{descricao}: esperado {esperado}, obtido {obtido}")
+
+    rng = np.random.default_rng(semente)
+    for caso in range(quantidade):
+        janela_dias = int(rng.integers(0, 6))
+        df_e = gerar_movimentacoes(rng, int(rng.integers(0, 40)), int(rng.choice([1, 3])), 'E')
+        df_c = gerar_movimentacoes(rng, int(rng.integers(0, 40)), int(rng.choice([1, 3])), 'C')
+        pares = _pares_janela(df_e, df_c, janela_dias)
+        dias_e = (df_e['data'] - pd.Timestamp('2024-01-01')).dt.days.to_numpy()
+        dias_c = (df_c['data'] - pd.Timestamp('2024-01-01')).dt.days.to_numpy()
+        valores_e = df_e['valor_centavos'].to_numpy()
+        valores_c = df_c['valor_centavos'].to_numpy()
+        sem_par_e = set(range(len(df_e))) - {i for i, _ in pares}
+        sem_par_c = set(range(len(df_c))) - {j for _, j in pares}
+
+        distancia = lambda i, j: abs(int(dias_e[i]) - int(dias_c[j]))
+        erros = [
+            (i, j) for i, j in pares
+            if valores_e[i] != valores_c[j] or distancia(i, j) > janela_dias
+            or any(valores_c[k] == valores_e[i] and distancia(i, k) < distancia(i, j) for k in sem_par_c)
+        ]
+        erros += [
+            (i, j) for i in sem_par_e for j in sem_par_c
+            if valores_e[i] == valores_c[j] and distancia(i, j) <= janela_dias
+        ]
+        if erros:
+            falhas.append(f"caso aleatório {caso} (janela {janela_dias}): pares inválidos {erros[:5]}")
+    return falhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comparação diferencial dos motores de conciliação")
+    parser.add_argument('motor', nargs='?', default='hash', choices=sorted(func.MOTORES_CONCILIACAO))
+    parser.add_argument('--casos', type=int, default=300)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--tamanho', type=int, default=2000, help="linhas de cada lado no caso de velocidade")
+    args = parser.parse_args(argv)
+
+    resultado = comparar_motor(args.motor, gerar_casos(args.casos, args.semente))
+    t_ref, t_motor = comparar_velocidade(args.motor, n=args.tamanho, semente=args.semente)
+    agrupamento = comparar_agrupamento_extrato(semente=args.semente)
+    conversao = comparar_conversao_valores(semente=args.semente)
+    falhas_janela = verificar_janela_datas(semente=args.semente)
+
+    print(f"Motor '{args.motor}' x referência '{MOTOR_REFERENCIA}': "
+          f"{resultado['casos_divergentes']}/{resultado['casos']} casos divergentes")
+    if resultado['primeira_divergencia'] is not None:
+        caso, diferencas = resultado['primeira_divergencia']
+        print(f"Primeira divergência (caso {caso}):")
+        print(diferencas.head(20).to_string(index=False))
+    print(f"Velocidade ({args.tamanho} x {args.tamanho}): referência {t_ref:.3f}s, motor {t_motor:.3f}s, "
+          f"razão {t_ref / max(t_motor, 1e-9):.1f}x")
+    print(f"agrupar_linhas_extrato x versão original: {agrupamento} casos divergentes")
+    print(f"converter_centavos x conversões originais: {len(conversao)} valores divergentes")
+    for texto, esperado, obtido in conversao[:10]:
+        print(f"  {texto!r}: esperado {esperado}, obtido {obtido}")
+    print(f"Janela de datas: {len(falhas_janela)} casos com falha")
+    for falha in falhas_janela[:10]:
+        print(f"  {falha}")
+
+    falhou = resultado['casos_divergentes'] or agrupamento or conversao or falhas_janela
+    return 1 if falhou else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,50 +1,112 @@
-import streamlit as st
 import pandas as pd
 import funcoes_especificas as func
 import relatorio as r
+import pendencias
+import desempenho
+
+def _linhas_resultado(resultado):
+    """Linhas do resultado compacto (pares e sem par), sem montar a visão por linha"""
+    return len(resultado['pares']) + len(resultado['extrato_sem_par']) + len(resultado['controle_sem_par'])
+
+def conciliar(ex, cf, si, janela_dias=None, agrupar=False, motor='hash', nome_usuario='Usuário não identificado',
+              livro=None, conta=None, registro=None, ao_concluir=None, memoria=False, avisos=None):
+    """
+    Núcleo da conciliação, sem dependência do Streamlit: recebe e devolve valores explícitos
+
+    Args:
+        ex, cf: DataFrames tratados do extrato e do controle (com valor_centavos)
+        si: saldo inicial em reais
+        janela_dias, agrupar, motor: opções da parear_conciliacao
+        nome_usuario: responsável exibido no relatório
+        livro, conta: se informados, a conciliação é incremental: usa o livro de
+            pendências (SQLite) da conta e concilia os lançamentos novos com os
+            itens em aberto de cargas anteriores; os pares só são baixados no livro
+            com pendencias.registrar_conciliacao (feito por conciliacao, após a exportação)
+        registro, ao_concluir, memoria: medição das etapas (ver desempenho.medir);
+            com registro=None nada é medido
+        avisos: lista que recebe os avisos da conciliação para quem a chamou
+            (por exemplo, o agrupamento interrompido pelo limite de tempo)
+
+    Returns:
+        tuple: (resultado compacto de parear_conciliacao, relatório em seções de
+        criar_relatorio_conciliação, baixa pendente no livro ou None sem livro)
+    """
+    # Todos os valores trabalham em centavos inteiros até a exportação
+    si = func.reais_para_centavos(si)
+
+    # Conciliação Simples (com janela de datas, se informada)
+    # e, opcionalmente, segunda passada de lançamentos agrupados
+    with desempenho.medir(registro, 'conciliação', ao_concluir, memoria) as medicao:
+        if livro is not None:
+            resultado, carga, baixa = pendencias.conciliar_incremental(livro, conta, ex, cf, motor=motor, janela_dias=janela_dias, agrupar=agrupar)
+        else:
+            resultado = func.parear_conciliacao(ex, cf, motor=motor, janela_dias=janela_dias, agrupar=agrupar)
+            carga = baixa = None
+        medicao['linhas'] = _linhas_resultado(resultado)
+
+    if resultado['agrupamento_interrompido'] and avisos is not None:
+        avisos.append(r.AVISO_AGRUPAMENTO_INTERROMPIDO)
+
+    # Quantidade de movimentações e saldos finais, sobre os mesmos lançamentos das
+    # tabelas do relatório (com livro, os itens em aberto: carga atual + pendências)
+    mov_extrato, total_extrato = func.contar_movimentacoes(resultado['extrato'], 'valor_extrato')
+    saldo_final_ex = si + total_extrato
+
+    mov_controle, total_controle = func.contar_movimentacoes(resultado['controle'], 'valor_controle')
+    saldo_final_cf = si + total_controle
 
-def conciliacao(ex, cf, si):
-    # st.write("### Dataframe Extrato")
-    # st.dataframe(ex)
-    #st.write("### Dataframe Controle Financeiro")
-    #st.dataframe(cf)
-    
-    # Quantidade de movimentações
-    mov_extrato, total_extrato = func.contar_movimentacoes(ex)
-    
-    st.session_state.saldo_final_ex = si + total_extrato
-    
-    mov_controle, total_controle = func.contar_movimentacoes(cf)
-    
-    st.session_state.saldo_final_cf = si + total_controle
-    
-    #st.write(f"Foram realizadas {mov_extrato} movimentações computadas pelo extrato")
-    #st.write(f"Destas {entradas_extrato} foram entradas")
-    #st.write(f"Destas {saidas_extrato} foram saídas")
-    #st.write("=======================================================================")
-    #st.write(f"Foram cadastradas {mov_controle} movimentações no Controle Financeiro")
-    #st.write(f"Destas {entradas_controle} foram entradas")
-    #st.write(f"Destas {saidas_controle} foram saídas")
-    
-    # Conciliação Simples
-    resultado = func.conciliacao_simples(ex,cf)
-     
     # CRIAÇÃO DO RELATÓRIO
-    nome_usuario = st.session_state.get('nome', 'Usuário não identificado')
-    
-    df_relatorico_conv, df_relatorio_div = r.criar_relatorio_conciliação(
-        resultado,
-        si,
-        mov_extrato,
-        mov_controle,
-        total_extrato,
-        total_controle,
-        nome_usuario
-    )
-    
-    excel_bytes = r.exportar_relatorio_excel(df_relatorico_conv, df_relatorio_div)
-    
-    return excel_bytes
-    
+    with desempenho.medir(registro, 'relatório', ao_concluir, memoria) as medicao:
+        relatorio = r.criar_relatorio_conciliação(
+            resultado,
+            si,
+            mov_extrato,
+            mov_controle,
+            total_extrato,
+            total_controle,
+            saldo_final_ex,
+            saldo_final_cf,
+            nome_usuario,
+            carga_livro=carga,
+        )
+        medicao['linhas'] = sum(secao['quantidade'] for secao in relatorio.values() if 'quantidade' in secao)
+
+    return resultado, relatorio, baixa
+
+# Formatos de exportação: etapa medida e exportador de cada um
+# Excel é o relatório formatado; Parquet e CSV trazem só as tabelas de dados (zip)
+EXPORTADORES = {
+    'xlsx': ('exportação Excel', r.exportar_relatorio_excel),
+    'parquet': ('exportação Parquet', r.exportar_relatorio_parquet),
+    'csv': ('exportação CSV', r.exportar_relatorio_csv),
+}
+
+def conciliacao(ex, cf, si, janela_dias=None, agrupar=False, motor='hash', nome_usuario='Usuário não identificado',
+                livro=None, conta=None, registro=None, ao_concluir=None, memoria=False, avisos=None,
+                formato='xlsx', decimal_br=False):
+    """
+    Conciliação completa, devolvendo o relatório exportado em bytes
+    formato: 'xlsx' (relatório Excel), 'parquet' ou 'csv' (zip com as tabelas de
+    dados); decimal_br só vale para o CSV (ver relatorio.exportar_relatorio_csv)
+    Com livro, os pares só são baixados depois da exportação, numa única transação:
+    se algo falhar antes, ou a tarefa for cancelada (ao_concluir interrompe ao fim
+    de uma etapa), o livro não é alterado e os itens continuam em aberto
+    """
+    if formato not in EXPORTADORES:
+        raise ValueError(f"Formato de exportação desconhecido: {formato!r}")
+    etapa, exportar = EXPORTADORES[formato]
     
-    
\ No newline at end of file
+    resultado, relatorio, baixa = conciliar(ex, cf, si, janela_dias, agrupar, motor, nome_usuario, livro, conta,
+                                     registro, ao_concluir, memoria, avisos)
+
+    with desempenho.medir(registro, etapa, ao_concluir, memoria) as medicao:
+        if formato == 'csv':
+            dados = exportar(relatorio, decimal_br=decimal_br)
+        else:
+            dados = exportar(relatorio)
+        medicao['linhas'] = _linhas_resultado(resultado)
+
+    if baixa is not None:
+        pendencias.registrar_conciliacao(livro, baixa)
+
+    return dados
@@ -0,0 +1,220 @@
+"""
+Conciliação em lote pela linha de comando (sem a interface Streamlit)
+
+Lê um manifesto com uma conciliação por linha (conta/mês) e processa as tarefas
+em paralelo com um ProcessPoolExecutor, gravando o relatório de cada uma na pasta
+de saída (Excel, ou um zip com as tabelas de dados em Parquet ou CSV) e imprimindo
+um resumo com o tempo de cada tarefa.
+
+O manifesto é um CSV (separador ',' ou ';') com as colunas:
+    extrato, formato_extrato, controle, formato_controle, saldo_inicial
+e, opcionalmente, 'nome' (nome do relatório gerado) e 'conta' (identificador da
+conta no livro de pendências, usado com --livro). Os formatos são os nomes
+registrados em formatos.py; caminhos relativos partem da pasta do manifesto.
+O saldo inicial aceita '1234.56' ou o padrão brasileiro '1.234,56'.
+
+Uso:
+    python conciliacao_lote.py manifesto.csv --saida relatorios/ [--processos N]
+        [--motor hash] [--janela-dias N] [--agrupar] [--usuario NOME] [--livro pendencias.db]
+        [--formato xlsx|parquet|csv] [--decimal-br]
+
+Com --livro, cada conta é conciliada de forma incremental: só os lançamentos novos
+entram no livro e as pendências sem par passam para a próxima execução. Nesse caso a
+coluna 'conta' é obrigatória, e as linhas de uma mesma conta rodam uma após a outra,
+na ordem do manifesto (contas diferentes continuam em paralelo).
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import formatos
+import funcoes_especificas as func
+import conciliacao as c
+
+COLUNAS_MANIFESTO = ['extrato', 'formato_extrato', 'controle', 'formato_controle', 'saldo_inicial']
+
+
+def ler_saldo(texto):
+    """Saldo inicial do manifesto em reais ('1234.56' ou '1.234,56')"""
+    try:
+        return float(texto)
+    except ValueError:
+        centavos, invalido = func.converter_centavos(pd.Series([texto], dtype=object))
+        if invalido.iloc[0]:
+            raise ValueError(f"Saldo inicial inválido: {texto!r}")
+        return func.centavos_para_reais(int(centavos.iloc[0]))
+
+
+def ler_manifesto(caminho, exigir_conta=False):
+    """
+    Lê o manifesto e devolve a lista de tarefas (um dicionário por linha)
+    Valida colunas e formatos antes de iniciar qualquer processamento
+    Com exigir_conta (conciliação incremental), toda linha precisa informar a conta:
+    o nome do arquivo muda a cada mês e não identifica o livro de pendências
+    """
+    manifesto = pd.read_csv(caminho, sep=None, engine='python', dtype=str, keep_default_na=False)
+    manifesto.columns = manifesto.columns.str.strip().str.lower()
+
+    faltando = [coluna for coluna in COLUNAS_MANIFESTO if coluna not in manifesto.columns]
+    if faltando:
+        raise ValueError(f"Colunas ausentes no manifesto: {', '.join(faltando)}")
+    if exigir_conta:
+        if 'conta' not in manifesto.columns:
+            raise ValueError("A coluna 'conta' é obrigatória no manifesto com --livro")
+        sem_conta = [str(i) for i, conta in enumerate(manifesto['conta'].str.strip(), start=1) if not conta]
+        if sem_conta:
+            raise ValueError(f"Linhas do manifesto sem conta: {', '.join(sem_conta)}")
+
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    tarefas = []
+    for i, linha in enumerate(manifesto.to_dict('records'), start=1):
+        formatos.obter_formato(linha['formato_extrato'])
+        formatos.obter_formato(linha['formato_controle'])
+        nome = linha.get('nome') or os.path.splitext(os.path.basename(linha['extrato']))[0]
+        tarefas.append({
+            'nome': f"{i:03d}_{nome}",
+            'extrato': os.path.join(pasta, linha['extrato']),
+            'formato_extrato': linha['formato_extrato'],
+            'controle': os.path.join(pasta, linha['controle']),
+            'formato_controle': linha['formato_controle'],
+            'saldo_inicial': ler_saldo(linha['saldo_inicial']),
+            'conta': (linha.get('conta') or '').strip() or nome,
+        })
+    return tarefas
+
+
+def executar_tarefa(tarefa, pasta_saida, opcoes):
+    """
+    Executa uma conciliação completa (leitura, conciliação e relatório) em um processo
+
+    Returns:
+        dict: nome, status, tempos de cada etapa, caminho do relatório ou erro
+    """
+    resultado = {'nome': tarefa['nome'], 'status': 'OK', 'erro': None, 'aviso': None, 'relatorio': None}
+    avisos = []
+    inicio = time.perf_counter()
+    try:
+        df_extrato = formatos.ler_arquivo_em_cache(tarefa['extrato'], tarefa['formato_extrato'])
+        df_controle = formatos.ler_arquivo_em_cache(tarefa['controle'], tarefa['formato_controle'])
+        resultado['tempo_leitura'] = time.perf_counter() - inicio
+
+        relatorio_bytes = c.conciliacao(
+            df_extrato,
+            df_controle,
+            tarefa['saldo_inicial'],
+            janela_dias=opcoes['janela_dias'],
+            agrupar=opcoes['agrupar'],
+            motor=opcoes['motor'],
+            nome_usuario=opcoes['usuario'],
+            livro=opcoes['livro'],
+            conta=tarefa['conta'],
+            formato=opcoes['formato'],
+            decimal_br=opcoes['decimal_br'],
+            avisos=avisos,
+        )
+        resultado['aviso'] = ' '.join(avisos) or None
+
+        extensao = 'xlsx' if opcoes['formato'] == 'xlsx' else f"{opcoes['formato']}.zip"
+        caminho = os.path.join(pasta_saida, f"relatorio_conciliação_{tarefa['nome']}.{extensao}")
+        with open(caminho, 'wb') as f:
+            f.write(relatorio_bytes)
+        resultado['relatorio'] = caminho
+    except Exception as e:
+        resultado['status'] = 'ERRO'
+        resultado['erro'] = f"{type(e).__name__}: {e}"
+    resultado.setdefault('tempo_leitura', time.perf_counter() - inicio)
+    resultado['tempo_total'] = time.perf_counter() - inicio
+    return resultado
+
+
+def executar_sequencia(tarefas, pasta_saida, opcoes):
+    """
+    Executa as tarefas uma após a outra, na ordem recebida (meses de uma mesma conta
+    no livro de pendências); depois de uma falha as seguintes não são executadas,
+    pois dependeriam das pendências que ela deixaria no livro
+    """
+    resultados = []
+    for tarefa in tarefas:
+        if resultados and resultados[-1]['status'] != 'OK':
+            resultados.append({
+                'nome': tarefa['nome'], 'status': 'ERRO', 'relatorio': None, 'aviso': None,
+                'erro': f"não executada: falha em {resultados[-1]['nome']} (mesma conta)",
+                'tempo_leitura': 0.0, 'tempo_total': 0.0,
+            })
+        else:
+            resultados.append(executar_tarefa(tarefa, pasta_saida, opcoes))
+    return resultados
+
+
+def executar_lote(tarefas, pasta_saida, opcoes, processos=None):
+    """
+    Processa as tarefas em paralelo e devolve os resultados na ordem do manifesto
+    Com o livro de pendências, as tarefas de uma mesma conta formam uma sequência:
+    cada mês parte das pendências deixadas pelo anterior
+    """
+    os.makedirs(pasta_saida, exist_ok=True)
+    if opcoes['livro']:
+        sequencias = {}
+        for tarefa in tarefas:
+            sequencias.setdefault(tarefa['conta'], []).append(tarefa)
+        sequencias = list(sequencias.values())
+    else:
+        sequencias = [[tarefa] for tarefa in tarefas]
+
+    resultados = {}
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        futuros = [executor.submit(executar_sequencia, sequencia, pasta_saida, opcoes) for sequencia in sequencias]
+        for futuro in as_completed(futuros):
+            for resultado in futuro.result():
+                resultados[resultado['nome']] = resultado
+                aviso = f" - {resultado['aviso']}" if resultado['aviso'] else ''
+                print(f"[{resultado['status']}] {resultado['nome']} ({resultado['tempo_total']:.2f}s){aviso}", flush=True)
+    return [resultados[tarefa['nome']] for tarefa in tarefas]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conciliação bancária em lote")
+    parser.add_argument('manifesto', help="CSV com as conciliações a processar")
+    parser.add_argument('--saida', default='relatorios', help="pasta dos relatórios gerados")
+    parser.add_argument('--processos', type=int, default=None, help="processos em paralelo (padrão: número de CPUs)")
+    parser.add_argument('--motor', default='hash', choices=sorted(func.MOTORES_CONCILIACAO))
+    parser.add_argument('--janela-dias', type=int, default=None, help="tolerância entre as datas (± dias)")
+    parser.add_argument('--agrupar', action='store_true', help="conciliar lançamentos agrupados (vários para um)")
+    parser.add_argument('--usuario', default='Conciliação em lote', help="nome do responsável no relatório")
+    parser.add_argument('--livro', default=None, help="livro de pendências (SQLite) para a conciliação incremental")
+    parser.add_argument('--formato', default='xlsx', choices=list(c.EXPORTADORES),
+                        help="xlsx (relatório formatado) ou parquet/csv (zip com as tabelas de dados)")
+    parser.add_argument('--decimal-br', action='store_true', help="CSV no padrão brasileiro (';' e vírgula decimal)")
+    args = parser.parse_args(argv)
+
+    tarefas = ler_manifesto(args.manifesto, exigir_conta=args.livro is not None)
+    opcoes = {
+        'motor': args.motor,
+        'janela_dias': args.janela_dias,
+        'agrupar': args.agrupar,
+        'usuario': args.usuario,
+        'livro': args.livro,
+        'formato': args.formato,
+        'decimal_br': args.decimal_br,
+    }
+
+    inicio = time.perf_counter()
+    resultados = executar_lote(tarefas, args.saida, opcoes, args.processos)
+    tempo_total = time.perf_counter() - inicio
+
+    # Resumo por tarefa
+    resumo = pd.DataFrame(resultados)[['nome', 'status', 'tempo_leitura', 'tempo_total', 'erro', 'aviso']]
+    print()
+    print(resumo.to_string(index=False, float_format=lambda t: f"{t:.2f}s", na_rep=''))
+    erros = int((resumo['status'] != 'OK').sum())
+    print(f"\n{len(resultados) - erros}/{len(resultados)} conciliações concluídas em {tempo_total:.2f}s")
+
+    return 1 if erros else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Medição de desempenho por etapa da conciliação
+
+Cada etapa medida vira um dicionário no registro (lista) com o nome da etapa, o tempo
+de parede, o número de linhas e, opcionalmente, o pico de memória alocada durante a
+etapa (tracemalloc, que deixa a execução mais lenta). O registro pode ser exibido no
+app, usado para avançar a barra de progresso (ao_concluir) e gravado em um log JSON.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+@contextmanager
+def medir(registro, etapa, ao_concluir=None, memoria=False):
+    """
+    Mede o bloco with como uma etapa e a acrescenta ao registro ao final
+    O número de linhas é informado dentro do bloco: medicao['linhas'] = len(df)
+
+    Args:
+        registro: lista que recebe a medição (None desliga a medição)
+        etapa: nome da etapa
+        ao_concluir: função chamada com a medição quando a etapa termina
+        memoria: se True, mede o pico de memória com tracemalloc
+    """
+    medicao = {'etapa': etapa, 'linhas': None, 'segundos': None, 'pico_memoria_mb': None}
+    if registro is None:
+        yield medicao
+        return
+
+    iniciou_rastreio = memoria and not tracemalloc.is_tracing()
+    if iniciou_rastreio:
+        tracemalloc.start()
+    if memoria:
+        tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    finally:
+        medicao['segundos'] = time.perf_counter() - inicio
+        if memoria:
+            medicao['pico_memoria_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        if iniciou_rastreio:
+            tracemalloc.stop()
+        registro.append(medicao)
+        if ao_concluir is not None:
+            ao_concluir(medicao)
+
+
+def blocos_cronometrados(blocos, medicao):
+    """
+    Repassa os blocos de um gerador acumulando em medicao o tempo gasto para
+    produzi-los e o total de linhas (para etapas em blocos, intercaladas com outras)
+    """
+    medicao['segundos'] = medicao.get('segundos') or 0.0
+    medicao['linhas'] = medicao.get('linhas') or 0
+    while True:
+        inicio = time.perf_counter()
+        try:
+            bloco = next(blocos)
+        except StopIteration:
+            medicao['segundos'] += time.perf_counter() - inicio
+            return
+        medicao['segundos'] += time.perf_counter() - inicio
+        medicao['linhas'] += len(bloco)
+        yield bloco
+
+
+def salvar_log(registro, caminho, **contexto):
+    """
+    Acrescenta uma linha JSON ao log de desempenho com as medições e o contexto
+    (por exemplo formato, motor e usuário)
+    """
+    linha = {
+        'momento': datetime.now().isoformat(timespec='seconds'),
+        **contexto,
+        'etapas': registro,
+    }
+    with open(caminho, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(linha, ensure_ascii=False, default=str) + '\n')
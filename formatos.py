@@ -0,0 +1,323 @@
+"""
+Registro dos formatos de extrato bancário e de controle financeiro
+
+Cada formato descreve como o arquivo Excel é lido e tratado: linha do cabeçalho,
+colunas usadas (e seus nomes no sistema), coluna de complemento da descrição,
+agrupamento de linhas de continuação, filtros, ordenação e conversão dos valores.
+A leitura de qualquer formato passa por uma única função (ler_arquivo), usada
+pelos apps Streamlit e por qualquer chamada sem interface.
+
+ler_arquivo_em_cache guarda o resultado tratado em Parquet, em disco, para que
+o mesmo arquivo não precise ser relido pelo openpyxl (requer pyarrow).
+"""
+import hashlib
+import io
+import os
+from functools import partial
+
+import pandas as pd
+import funcoes_especificas as func
+import desempenho
+
+# Tipos explícitos das colunas lidas; a data fica com o tipo do Excel (datetime ou texto)
+# e o valor como object, pois pode vir como número ou como texto no padrão brasileiro
+TIPOS_COLUNAS = {
+    'documento': str,
+    'descricao': str,
+    'complemento': str,
+    'contraparte': str,
+    'plano de contas': str,
+    'valor': object,
+}
+
+FORMATOS_EXTRATO = {
+    "SICOOB": {
+        'rotulo': "Extrato extraído do banco SICOOB no formato Excel",
+        'cabecalho': 1,
+        'colunas': {"DATA": "data", "DOCUMENTO": "documento", "HISTÓRICO": "descricao", "VALOR": "valor"},
+        'agrupar_continuacao': True,
+        'palavras_remover': func.PALAVRAS_REMOVER,
+        'ordenar': True,
+        'conversor': func.converter_centavos,
+        'versao': 5,
+    },
+    "Banco do Brasil": {
+        'rotulo': "Extrato extraído do Banco do Brasil no formato Excel",
+        'cabecalho': 0,
+        'colunas': {"Data": "data", "N° documento": "documento", "Lançamento": "descricao", "Detalhes": "complemento", "Valor": "valor"},
+        'agrupar_continuacao': False,
+        'palavras_remover': func.PALAVRAS_REMOVER,
+        'ordenar': False,
+        'conversor': func.converter_centavos,
+        'versao': 5,
+    },
+    "Extrato Padrão": {
+        'rotulo': "Extrato no formato Excel padrão",
+        'cabecalho': 0,
+        'colunas': {"DATA": "data", "DOCUMENTO": "documento", "DESCRIÇÃO": "descricao", "INFORMAÇÕES ADICIONAIS": "complemento", "VALOR": "valor"},
+        'agrupar_continuacao': False,
+        'palavras_remover': func.PALAVRAS_REMOVER,
+        'ordenar': True,
+        'conversor': func.converter_centavos,
+        'versao': 5,
+    },
+}
+
+FORMATOS_CONTROLE = {
+    "Controle Financeiro Perfarm": {
+        'rotulo': "Controle Financeiro extraído do sistema Perfarm no formato Excel",
+        'cabecalho': 5,
+        'colunas': {"Data": "data", "Recurso": "descricao", "Contraparte": "contraparte", "Plano de Contas": "plano de contas", "Valor": "valor"},
+        'agrupar_continuacao': False,
+        'palavras_remover': func.PALAVRAS_REMOVER,
+        'ordenar': False,
+        'conversor': func.converter_centavos,
+        'versao': 5,
+    },
+    "Controle Financeiro Padrão": {
+        'rotulo': "Controle Financeiro no formato Excel Padrão",
+        'cabecalho': 0,
+        'colunas': {"Data": "data", "Descrição": "descricao", "Contraparte": "contraparte", "Plano de Contas": "plano de contas", "Valor": "valor"},
+        'agrupar_continuacao': False,
+        'palavras_remover': [],
+        'ordenar': False,
+        'conversor': func.converter_centavos,
+        'versao': 5,
+    },
+}
+
+FORMATOS = {**FORMATOS_EXTRATO, **FORMATOS_CONTROLE}
+
+# Pasta do cache em disco dos arquivos já tratados
+PASTA_CACHE = os.environ.get('CONCILIACAO_PASTA_CACHE', '.cache_conciliacao')
+
+
+def obter_formato(nome_formato):
+    """Retorna a especificação do formato, com erro claro para nomes desconhecidos"""
+    if nome_formato not in FORMATOS:
+        raise ValueError(f"Formato desconhecido: {nome_formato!r}. Opções: {', '.join(FORMATOS)}")
+    return FORMATOS[nome_formato]
+
+
+def ler_blocos(arquivo, nome_formato, tamanho_bloco=func.TAMANHO_BLOCO):
+    """
+    Lê o arquivo Excel em blocos de linhas (openpyxl em modo read-only), apenas com as
+    colunas do formato, já renomeadas e com os tipos de TIPOS_COLUNAS, e com o
+    complemento anexado à descrição
+
+    Yields:
+        DataFrame de até tamanho_bloco linhas (ao menos um bloco, mesmo vazio)
+    """
+    from openpyxl import load_workbook
+
+    obter_formato(nome_formato)
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from blocos_de_linhas(workbook.worksheets[0].iter_rows(values_only=True), nome_formato, tamanho_bloco)
+    finally:
+        workbook.close()
+
+
+def blocos_de_linhas(linhas, nome_formato, tamanho_bloco=func.TAMANHO_BLOCO):
+    """
+    Blocos de ler_blocos a partir das linhas da planilha (tuplas de valores, como
+    as do iter_rows do openpyxl), a partir da linha de cabeçalho do formato
+
+    Yields:
+        DataFrame de até tamanho_bloco linhas (ao menos um bloco, mesmo vazio)
+    """
+    formato = obter_formato(nome_formato)
+    colunas = formato['colunas']
+    linhas = iter(linhas)
+
+    # Cabeçalho na linha indicada pelo formato
+    for _ in range(formato['cabecalho']):
+        next(linhas, None)
+    cabecalho = [None if nome is None else str(nome) for nome in next(linhas, ())]
+    faltando = [origem for origem in colunas if origem not in cabecalho]
+    if faltando:
+        raise ValueError(f"Colunas não encontradas no arquivo: {', '.join(faltando)}")
+    posicoes = [cabecalho.index(origem) for origem in colunas]
+
+    buffer = []
+    produzidos = 0
+    for linha in linhas:
+        buffer.append([linha[i] if i < len(linha) else None for i in posicoes])
+        if len(buffer) >= tamanho_bloco:
+            yield _montar_bloco(buffer, colunas)
+            produzidos += 1
+            buffer = []
+    if buffer or not produzidos:
+        yield _montar_bloco(buffer, colunas)
+
+
+# Textos tratados como vazios, como na leitura do pandas
+VALORES_VAZIOS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                  '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+
+def _montar_bloco(linhas, colunas):
+    """DataFrame de um bloco de linhas lidas, com os tipos explícitos de cada coluna"""
+    dados = {}
+    for j, destino in enumerate(colunas.values()):
+        valores = [linha[j] for linha in linhas]
+        valores = [None if isinstance(v, str) and v in VALORES_VAZIOS else v for v in valores]
+        tipo = TIPOS_COLUNAS.get(destino)
+        if tipo is str:
+            serie = pd.Series(valores, dtype=object)
+            dados[destino] = serie.astype(str).where(serie.notna())
+        elif tipo is object:
+            dados[destino] = pd.Series(valores, dtype=object)
+        else:
+            dados[destino] = pd.Series(valores)
+    df = pd.DataFrame(dados)
+
+    # Complemento da descrição (Detalhes, Informações Adicionais...)
+    if 'complemento' in df.columns:
+        df['descricao'] = df['descricao'].fillna('--') + ' | ' + df['complemento'].fillna('--')
+        df = df.drop(columns='complemento')
+    return df
+
+
+def etapas_tratamento(nome_formato, linhas_removidas=None):
+    """
+    Etapas de bloco do formato: datas, filtro (linhas vazias e palavras a remover,
+    numa só etapa) e conversão dos valores
+    linhas_removidas, se informado, acumula quantas linhas cada regra do filtro removeu
+    Cada etapa recebe só o bloco; as parciais mantêm o nome da função (etapa.func),
+    usado pelo benchmark para medir as etapas na mesma ordem
+    """
+    formato = obter_formato(nome_formato)
+    return [
+        func.normalizar_datas_bloco,
+        partial(func.filtrar_linhas, palavras_remover=formato['palavras_remover'], linhas_removidas=linhas_removidas),
+        partial(func.converter_valores_bloco, conversor=formato['conversor']),
+    ]
+
+
+def ler_arquivo(arquivo, nome_formato, tamanho_bloco=func.TAMANHO_BLOCO, registro=None, memoria=False):
+    """
+    Lê e trata um arquivo de extrato ou de controle financeiro conforme o formato registrado
+    Apenas as colunas do formato são lidas, já com os tipos explícitos; o tratamento
+    é feito em blocos de linhas e o DataFrame final é montado uma única vez
+
+    Args:
+        arquivo: caminho ou arquivo (file-like) Excel
+        nome_formato: chave de FORMATOS
+        tamanho_bloco: linhas por bloco no tratamento
+        registro, memoria: ver tratar_blocos_formato
+
+    Returns:
+        DataFrame tratado (ver tratar_blocos_formato)
+    """
+    return tratar_blocos_formato(ler_blocos(arquivo, nome_formato, tamanho_bloco), nome_formato, registro, memoria)
+
+
+def tratar_blocos_formato(blocos, nome_formato, registro=None, memoria=False):
+    """
+    Tratamento completo dos blocos lidos (ler_blocos ou blocos_de_linhas): agrupamento
+    das linhas de continuação, etapas de bloco, junção, colunas categóricas e ordenação
+
+    Args:
+        blocos: gerador de blocos, consumido sob demanda dentro da medição
+        nome_formato: chave de FORMATOS
+        registro, memoria: se informado, recebe as medições das etapas 'leitura'
+            (blocos + agrupamento) e 'tratamento' (ver desempenho.medir); como as
+            duas se intercalam bloco a bloco, o pico de memória é o da leitura inteira
+
+    Returns:
+        DataFrame tratado, com data (datetime64), valor_centavos (Int64) e
+        contraparte / plano de contas categóricos (compactar_colunas);
+        df.attrs['linhas_removidas'] traz as linhas removidas por regra do filtro
+    """
+    formato = obter_formato(nome_formato)
+    leitura = {'etapa': 'leitura', 'linhas': 0, 'segundos': 0.0, 'pico_memoria_mb': None}
+
+    with desempenho.medir(registro, 'tratamento', memoria=memoria) as tratamento:
+        # Linhas de continuação da descrição (SICOOB)
+        if formato['agrupar_continuacao']:
+            blocos = func.agrupar_blocos_extrato(blocos)
+
+        if registro is not None:
+            blocos = desempenho.blocos_cronometrados(blocos, leitura)
+
+        linhas_removidas = {}
+        df = func.juntar_blocos(func.tratar_blocos(blocos, etapas_tratamento(nome_formato, linhas_removidas)))
+        df = func.compactar_colunas(df)
+
+        # A ordenação é a única etapa sobre o arquivo inteiro
+        if formato['ordenar']:
+            df = func.ordernar_arquivo(df)
+        tratamento['linhas'] = len(df)
+
+    # Quantas linhas cada regra do filtro removeu (vai junto para o cache em Parquet)
+    df.attrs['linhas_removidas'] = linhas_removidas
+
+    if registro is not None:
+        # O tempo medido do tratamento inclui a leitura dos blocos
+        tratamento['segundos'] -= leitura['segundos']
+        registro.insert(registro.index(tratamento), leitura)
+
+    return df
+
+
+def _conteudo_arquivo(arquivo):
+    """Bytes do arquivo, seja um caminho, um UploadedFile do Streamlit ou um file-like"""
+    if hasattr(arquivo, 'getvalue'):
+        return arquivo.getvalue()
+    if hasattr(arquivo, 'read'):
+        posicao = arquivo.tell()
+        conteudo = arquivo.read()
+        arquivo.seek(posicao)
+        return conteudo
+    with open(arquivo, 'rb') as f:
+        return f.read()
+
+
+def nome_arquivo_cache(conteudo, nome_formato):
+    """
+    Nome do arquivo de cache: hash do conteúdo + formato + versão da especificação
+    Mudar a versão de um formato invalida o cache de todos os arquivos daquele formato
+    """
+    formato = obter_formato(nome_formato)
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+    hash_formato = hashlib.sha256(nome_formato.encode('utf-8')).hexdigest()[:12]
+    return f"{hash_conteudo}_{hash_formato}_v{formato['versao']}.parquet"
+
+
+def ler_arquivo_em_cache(arquivo, nome_formato, pasta_cache=None, registro=None, memoria=False):
+    """
+    Mesmo resultado de ler_arquivo, guardado em Parquet na pasta de cache
+    Uma segunda leitura do mesmo arquivo (mesmo conteúdo e formato) carrega o Parquet
+    em vez de reprocessar o Excel. Sem pyarrow instalado, apenas chama ler_arquivo.
+
+    Com registro, a leitura do cache é medida como a etapa 'leitura (cache)'.
+    """
+    try:
+        import pyarrow  # noqa: F401 (dependência opcional do cache)
+    except ImportError:
+        return ler_arquivo(arquivo, nome_formato, registro=registro, memoria=memoria)
+
+    pasta_cache = pasta_cache or PASTA_CACHE
+    conteudo = _conteudo_arquivo(arquivo)
+    caminho = os.path.join(pasta_cache, nome_arquivo_cache(conteudo, nome_formato))
+
+    if os.path.exists(caminho):
+        try:
+            with desempenho.medir(registro, 'leitura (cache)', memoria=memoria) as medicao:
+                df = pd.read_parquet(caminho)
+                medicao['linhas'] = len(df)
+            return df
+        except Exception:
+            # Cache corrompido ou incompleto: reprocessa o arquivo
+            pass
+
+    df = ler_arquivo(io.BytesIO(conteudo), nome_formato, registro=registro, memoria=memoria)
+
+    # Grava em arquivo temporário e renomeia, para nunca deixar um Parquet pela metade
+    os.makedirs(pasta_cache, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    df.to_parquet(temporario)
+    os.replace(temporario, caminho)
+
+    return df
@@ -1,278 +1,371 @@
 from numpy import dtype
-import streamlit as st
+import numpy as np
+import re
+import time
 import pandas as pd
 
-def converter_valor(valor_str):
+# Formato brasileiro: "-R$ 1.204,54", "- 850,00 D", "63.173,85 C", "125,50"
+PADRAO_VALOR_BR = (
+    r'^(?P<hifen>-)?\s*(?:R\$)?\s*(?P<hifen_valor>-)?\s*'
+    r'(?P<inteiro>[0-9.]*)(?:,(?P<decimal>[0-9]*))?\s*(?P<letra>[CD])?$'
+)
+
+# Parte inteira sem vírgula com um único ponto decimal: "1234.56", "50.5"
+PADRAO_PONTO_DECIMAL = r'^(?P<inteiro>[0-9]*)\.(?P<decimal>[0-9]{1,2})$'
+
+def reais_para_centavos(valores):
     """
-    Converte valores no formato brasileiro com C/D para float
-    Exemplos:
-    "3.256,00C" -> 3256.00
-    "3.256,00D" -> -3256.00
-    "125,50" -> 125.50
-    "1000,00" -> 1000.00
+    Converte valores em reais (float ou Series de floats) para centavos inteiros
+    Exemplo: 1204.54 -> 120454
     """
-    try:
-        valor_str = str(valor_str).strip().upper()
-        
-        # Define sinal: C = positivo, D = negativo
-        if valor_str.endswith('C'):
-            sinal = 1
-            numero_limpo = valor_str[:-1]  # Remove o 'C'
-        elif valor_str.endswith('D'):
-            sinal = -1
-            numero_limpo = valor_str[:-1]  # Remove o 'D'
-        else:
-            sinal = 1
-            numero_limpo = valor_str
-        
-        # Remove apenas os pontos que são separadores de milhar
-        # Verifica se tem vírgula (formato brasileiro)
-        if ',' in numero_limpo:
-            # Separa parte inteira e decimal
-            partes = numero_limpo.split(',')
-            parte_inteira = partes[0]
-            parte_decimal = partes[1]
-            
-            # Remove pontos apenas da parte inteira (milhar)
-            parte_inteira = parte_inteira.replace('.', '')
-            
-            # Junta com ponto como separador decimal
-            numero_limpo = parte_inteira + '.' + parte_decimal
-        else:
-            # Se não tem vírgula, trata como número inteiro
-            numero_limpo = numero_limpo.replace('.', '')
-        
-        # Converte para float e aplica sinal
-        return float(numero_limpo) * sinal
-        
-    except:
-        return None
+    if isinstance(valores, pd.Series):
+        return np.rint(pd.to_numeric(valores, errors='coerce') * 100).astype('Int64')
+    return int(round(float(valores) * 100))
 
-def converter_valor_extrato(valor_str):
+def centavos_para_reais(centavos):
     """
-    Converte valores no formato brasileiro com C/D para float
-    Agora trata casos com espaço e hífen:
-    "1.204,54 C" -> 1204.54
-    "- 850,00 D" -> -850.00
-    "63.173,85 C" -> 63173.85
+    Converte centavos inteiros de volta para reais
+    Usado apenas na exportação do relatório
+    Exemplo: 120454 -> 1204.54
     """
-    try:
-        # Se for None ou vazio
-        if valor_str is None:
-            return None
-            
-        valor_str = str(valor_str).strip().upper()
-        
-        if valor_str == "" or valor_str == "NAN":
-            return None
-        
-        # Remove qualquer hífen no início (com ou sem espaço)
-        if valor_str.startswith('-'):
-            valor_str = valor_str[1:].strip()
-            # Se tinha hífen, já forçamos negativo, independente da letra
-            sinal_forcado = -1
-        else:
-            sinal_forcado = None
-        
-        # Remove espaços extras e identifica C/D
-        # Pode terminar com "C", " D", "C ", etc
-        valor_str = valor_str.strip()
-        
-        # Define sinal baseado na letra (se não tiver sinal_forcado)
-        if valor_str.endswith('C'):
-            sinal = 1
-            numero_limpo = valor_str[:-1].strip()  # Remove 'C' e espaços
-        elif valor_str.endswith('D'):
-            sinal = -1
-            numero_limpo = valor_str[:-1].strip()  # Remove 'D' e espaços
-        else:
-            sinal = 1
-            numero_limpo = valor_str.strip()
-        
-        # Sobrescreve sinal se tinha hífen no início
-        if sinal_forcado is not None:
-            sinal = sinal_forcado
-        
-        # Remove apenas os pontos que são separadores de milhar
-        if ',' in numero_limpo:
-            partes = numero_limpo.split(',')
-            parte_inteira = partes[0]
-            parte_decimal = partes[1]
-            
-            # Remove pontos apenas da parte inteira (milhar)
-            parte_inteira = parte_inteira.replace('.', '')
-            
-            # Junta com ponto como separador decimal
-            numero_limpo = parte_inteira + '.' + parte_decimal
-        else:
-            numero_limpo = numero_limpo.replace('.', '')
-        
-        # Converte para float e aplica sinal
-        return float(numero_limpo) * sinal
-        
-    except Exception as e:
-        print(f"Erro ao converter '{valor_str}': {e}")
-        return None
-    
-def remover_linhas_vazias(df, colunas_verificar=['descricao', 'valor']):
+    if isinstance(centavos, pd.Series):
+        return centavos.astype('Float64') / 100
+    return int(centavos) / 100
+
+def converter_centavos(serie):
     """
-    Remove linhas com valores vazios/None nas colunas especificadas
+    Converte uma coluna inteira de valores no formato brasileiro para centavos
+    inteiros (int64), de forma vetorizada e sem arredondamento de ponto flutuante
+    Atende a todos os formatos de extrato e de controle financeiro:
+    "1.204,54 C" -> 120454
+    "- 850,00 D" -> -85000
+    "-R$ 497,21" -> -49721
+    "125,50" -> 12550
+    "1234.56" -> 123456 (sem vírgula, um único ponto seguido de 1 ou 2 dígitos é
+    o separador decimal; nos demais casos o ponto separa milhares: "1.234" -> 123400)
+    Valores que já são numéricos (em reais) são apenas convertidos para centavos.
     
     Args:
-        df: DataFrame com os dados
-        colunas_verificar: Lista de colunas para verificar vazios
+        serie: Series com os valores a converter
     
     Returns:
-        DataFrame sem linhas vazias
+        tuple: (Series Int64 em centavos, máscara booleana das linhas inválidas)
     """
-    df_limpo = df.copy()
+    tipo = pd.api.types.infer_dtype(serie, skipna=True)
     
-    for coluna in colunas_verificar:
-        if coluna in df_limpo.columns:
-            # Remove linhas onde a coluna é None, NaN, vazia ou string vazia
-            mask = (
-                df_limpo[coluna].notna() & 
-                (df_limpo[coluna].astype(str).str.strip() != '') &
-                (df_limpo[coluna].astype(str).str.strip() != 'NAN') &
-                (df_limpo[coluna].astype(str).str.strip() != 'NONE')
-            )
-            df_limpo = df_limpo[mask]
+    # Coluna já numérica: apenas passa para centavos
+    if pd.api.types.is_numeric_dtype(serie) or tipo in ('integer', 'floating', 'mixed-integer-float', 'decimal', 'empty'):
+        centavos = reais_para_centavos(serie)
+        return centavos, centavos.isna()
     
-    return df_limpo
+    # Identifica quais células são texto (colunas mistas vindas do Excel)
+    try:
+        eh_texto = serie.str.len().notna()
+    except AttributeError:
+        eh_texto = pd.Series(False, index=serie.index)
+    
+    # Células numéricas dentro de uma coluna de texto
+    centavos = reais_para_centavos(serie.where(~eh_texto))
+    
+    # Quebra o texto em: hífen, "R$", parte inteira, parte decimal e letra C/D
+    partes = serie.where(eh_texto).str.strip().str.upper().str.extract(PADRAO_VALOR_BR)
+    
+    # Sem vírgula, um único ponto seguido de 1 ou 2 dígitos é o separador decimal
+    # (texto numérico comum, "1234.56" ou "-50.5")
+    ponto_decimal = partes['inteiro'].str.extract(PADRAO_PONTO_DECIMAL)
+    eh_ponto_decimal = partes['decimal'].isna() & ponto_decimal['inteiro'].notna()
+    partes['inteiro'] = partes['inteiro'].mask(eh_ponto_decimal, ponto_decimal['inteiro'])
+    partes['decimal'] = partes['decimal'].mask(eh_ponto_decimal, ponto_decimal['decimal'])
+    
+    # Remove apenas os pontos que são separadores de milhar
+    parte_inteira = partes['inteiro'].fillna('').str.replace('.', '', regex=False)
+    parte_decimal = partes['decimal'].fillna('')
+    tem_digito = (parte_inteira.str.len() + parte_decimal.str.len()) > 0
+    
+    # Parte inteira e decimal são somadas já em centavos, sem passar por float
+    inteiro = pd.to_numeric(parte_inteira.mask(parte_inteira == '', '0'), errors='coerce')
+    decimal = np.rint(pd.to_numeric('0.' + parte_decimal.mask(parte_decimal == '', '0'), errors='coerce') * 100)
+    numero = (inteiro * 100 + decimal).where(tem_digito).astype('Int64')
+    
+    # Hífen força negativo, independente da letra; sem hífen, D = negativo
+    negativo = partes['hifen'].notna() | partes['hifen_valor'].notna() | (partes['letra'] == 'D')
+    numero = numero.where(~negativo, -numero)
+    
+    centavos = centavos.where(~eh_texto, numero)
+    
+    return centavos, centavos.isna()
 
-def remover_linhas_desnecessarias(df, coluna_descricao='descricao', palavras_remover=None):
+# Palavras (ou partes de palavras) do histórico que identificam linhas que não são
+# movimentações, como os saldos; cada formato usa a sua lista ('palavras_remover')
+PALAVRAS_REMOVER = ['SALDO BLOQUEADO ANTERIOR', 'A Perfarm', 'SALDO DO DIA', 'SALDO ANTERIOR', 'S A L D O']
+
+# Textos (já sem espaços nas pontas) tratados como célula vazia
+TEXTOS_VAZIOS = ['', 'NAN', 'NONE']
+
+def compilar_filtro(palavras_remover):
     """
-    Remove linhas baseadas em palavras ou partes de palavras no histórico
+    Expressão única com todas as palavras a remover, em maiúsculo e escapadas
+    As mais longas vêm primeiro, para que a regra identificada seja a mais específica
+    
+    Returns:
+        re.Pattern, ou None se não houver palavras
+    """
+    palavras = sorted({palavra.upper() for palavra in palavras_remover}, key=len, reverse=True)
+    if not palavras:
+        return None
+    return re.compile('|'.join(re.escape(palavra) for palavra in palavras))
+
+def _contar_removidas(linhas_removidas, regra, quantidade):
+    if linhas_removidas is not None:
+        linhas_removidas[regra] = linhas_removidas.get(regra, 0) + int(quantidade)
+
+def filtrar_linhas(df, palavras_remover=(), colunas_verificar=('descricao', 'valor'),
+                   coluna_descricao='descricao', linhas_removidas=None):
+    """
+    Etapa única de filtro: remove as linhas vazias nas colunas verificadas e as linhas
+    cuja descrição contém alguma das palavras a remover (sem diferenciar maiúsculas)
+    Cada coluna é convertida em texto uma única vez (sem espaços nas pontas; a descrição
+    também em maiúsculo) e todas as palavras são buscadas numa só passada, com uma
+    expressão compilada
     
     Args:
         df: DataFrame com os dados
-        palavras_remover: Lista de palavras para remover
-        coluna_descricao: Nome da coluna indicada
+        palavras_remover: lista de palavras ou partes de palavras do histórico
+        colunas_verificar: colunas que não podem estar vazias
+        coluna_descricao: coluna onde as palavras são buscadas
+        linhas_removidas: dict opcional que acumula, por regra ('vazio: coluna' ou a
+            palavra), quantas linhas foram removidas; cada linha conta só na primeira
+            regra que a remove
     
     Returns:
         DataFrame filtrado
     """
-    if palavras_remover is None:
-        palavras_remover = [
-            'SALDO BLOQUEADO ANTERIOR', 'A Perfarm', 'SALDO DO DIA', 'SALDO ANTERIOR', 'S A L D O' ]
+    remover = np.zeros(len(df), dtype=bool)
+    textos = {}
+    
+    for coluna in colunas_verificar:
+        if coluna in df.columns:
+            textos[coluna] = df[coluna].astype(str).str.strip()
+            vazio = (df[coluna].isna() | textos[coluna].isin(TEXTOS_VAZIOS)).to_numpy(dtype=bool)
+            _contar_removidas(linhas_removidas, f'vazio: {coluna}', (vazio & ~remover).sum())
+            remover |= vazio
+    
+    filtro = compilar_filtro(palavras_remover)
+    if filtro is not None and coluna_descricao in df.columns:
+        texto = textos.get(coluna_descricao)
+        if texto is None:
+            texto = df[coluna_descricao].astype(str)
+        texto = texto.str.upper()
+        contem = texto.str.contains(filtro.pattern, regex=True, na=False).to_numpy(dtype=bool) & ~remover
+        
+        if linhas_removidas is not None:
+            # Só as linhas removidas passam pela identificação da regra
+            regras = texto[contem].str.extract(f'({filtro.pattern})', expand=False).value_counts()
+            for palavra in palavras_remover:
+                _contar_removidas(linhas_removidas, palavra, regras.get(palavra.upper(), 0))
+        remover |= contem
+    
+    if not remover.any():
+        return df
+    return df[~remover]
+
+def _linhas_principais(df):
+    """Linha principal do extrato = linha com data preenchida"""
+    return df['data'].notna() & (df['data'].astype(str).str.strip() != "")
+
+def agrupar_linhas_extrato(df):
+    """
+    Junta as linhas complementares do extrato (sem data) à linha principal anterior
+    A descrição complementar é anexada como "descrição principal | complemento"
+    Feito por colunas: cada linha com data abre um grupo (soma acumulada) e as
+    descrições complementares são unidas por groupby
     
-    # Converte tudo para maiúsculo para busca case-insensitive
-    descricao_upper = df[coluna_descricao].astype(str).str.upper()
+    Args:
+        df: DataFrame com as colunas 'data' e 'descricao'
     
-    # Cria máscara inicial como False
-    mask_remover = descricao_upper.isin([])  # Inicia vazia
+    Returns:
+        DataFrame apenas com as linhas principais
+    """
+    principal = _linhas_principais(df)
+    grupo = principal.cumsum()
     
-    # Para cada palavra na lista, busca se aparece em qualquer parte do histórico
-    for palavra in palavras_remover:
-        mask_remover = mask_remover | descricao_upper.str.contains(palavra, na=False)
+    # Descrições complementares não vazias (antes da primeira data não têm a quem se juntar)
+    descricao = df['descricao'].where(df['descricao'].notna(), "").astype(str).str.strip()
+    complementar = ~principal & (descricao != "") & (grupo > 0)
+    complementos = descricao[complementar].groupby(grupo[complementar]).agg(" ".join)
     
-    # Inverte a máscara: mantém apenas as linhas que NÃO contêm as palavras
-    mask_manter = ~mask_remover
+    linhas_agrupadas = df[principal].reset_index(drop=True)
+    complemento_linha = grupo[principal].map(complementos).reset_index(drop=True)
+    tem_complemento = complemento_linha.notna()
     
-    df_filtrado = df[mask_manter]
+    if tem_complemento.any():
+        linhas_agrupadas['descricao'] = linhas_agrupadas['descricao'].astype(object)
+        linhas_agrupadas.loc[tem_complemento, 'descricao'] = (
+            linhas_agrupadas.loc[tem_complemento, 'descricao'].fillna("").astype(str)
+            + " | " + complemento_linha[tem_complemento]
+        )
     
-    return df_filtrado
+    # Mesmos tipos que a montagem linha a linha produzia
+    return linhas_agrupadas.infer_objects()
 
-def agrupar_linhas_extrato(df):
-    linhas_agrupadas = []
-    buffer_descricao = ""
+# Tratamento em blocos: cada etapa recebe e devolve um bloco (DataFrame) de linhas,
+# para que arquivos grandes passem pelo tratamento com memória limitada; o DataFrame
+# final só é montado uma vez, em juntar_blocos
+TAMANHO_BLOCO = 50_000
 
-    for _, row in df.iterrows():
-        data = row['data']
-        valor = row['valor']
+def dividir_em_blocos(df, tamanho_bloco=TAMANHO_BLOCO):
+    """Divide um DataFrame já carregado em blocos de até tamanho_bloco linhas"""
+    if df.empty:
+        yield df
+        return
+    for inicio in range(0, len(df), tamanho_bloco):
+        yield df.iloc[inicio:inicio + tamanho_bloco]
 
-        # ⚠️ TRATAMENTO CORRETO DA DESCRIÇÃO
-        descricao = row['descricao']
-        if pd.notna(descricao):
-            descricao = str(descricao).strip()
-        else:
-            descricao = ""
+def agrupar_blocos_extrato(blocos):
+    """
+    agrupar_linhas_extrato aplicada a uma sequência de blocos
+    A última linha principal de cada bloco (e suas complementares) fica retida até
+    o bloco seguinte, pois as linhas complementares podem continuar nele
+    """
+    pendente = None
+    for bloco in blocos:
+        if pendente is not None:
+            bloco = pd.concat([pendente, bloco], ignore_index=True)
+        posicoes = np.flatnonzero(_linhas_principais(bloco).to_numpy(dtype=bool))
+        if len(posicoes) == 0:
+            pendente = bloco
+            continue
+        pronto, pendente = bloco.iloc[:posicoes[-1]], bloco.iloc[posicoes[-1]:]
+        if len(pronto):
+            yield agrupar_linhas_extrato(pronto)
+    if pendente is not None:
+        yield agrupar_linhas_extrato(pendente)
 
-        # Linha principal
-        if pd.notna(data) and str(data).strip() != "":
-            if buffer_descricao:
-                linhas_agrupadas[-1]['descricao'] += " | " + buffer_descricao
-                buffer_descricao = ""
+def normalizar_datas_bloco(bloco):
+    """Etapa de bloco: normaliza a coluna 'data' (normalizar_datas)"""
+    return bloco.assign(data=normalizar_datas(bloco['data']))
 
-            linhas_agrupadas.append(row.to_dict())
+def converter_valores_bloco(bloco, conversor=None):
+    """
+    Etapa de bloco: troca 'valor' (texto ou número, como lido) por 'valor_centavos'
+    (Int64) e descarta as linhas cujo valor não pôde ser convertido
+    """
+    conversor = conversor or converter_centavos
+    centavos, valores_invalidos = conversor(bloco['valor'])
+    bloco = bloco.drop(columns='valor').assign(valor_centavos=centavos)
+    if valores_invalidos.any():
+        bloco = bloco[~valores_invalidos.to_numpy(dtype=bool)]
+    return bloco
 
-        else:
-            # Linha complementar
-            if descricao:  # só entra se NÃO for vazio
-                if buffer_descricao:
-                    buffer_descricao += " " + descricao
-                else:
-                    buffer_descricao = descricao
+def tratar_blocos(blocos, etapas):
+    """Aplica as etapas, em ordem, a cada bloco, sob demanda (gerador)"""
+    for bloco in blocos:
+        for etapa in etapas:
+            bloco = etapa(bloco)
+        yield bloco
 
-    # Final
-    if buffer_descricao and linhas_agrupadas:
-        linhas_agrupadas[-1]['descricao'] += " | " + buffer_descricao
+def juntar_blocos(blocos):
+    """
+    Monta o DataFrame final a partir dos blocos já tratados
+    O índice é refeito (0..n-1): cada bloco traz a numeração própria, com lacunas das
+    linhas filtradas, e os formatos sem ordenação não passam pelo reset de ordernar_arquivo
+    """
+    blocos = list(blocos)
+    if len(blocos) == 1:
+        return blocos[0].reset_index(drop=True)
+    return pd.concat(blocos, ignore_index=True)
 
-    return pd.DataFrame(linhas_agrupadas)
+# Textos com poucos valores distintos, guardados como categoria (um código por linha)
+COLUNAS_CATEGORICAS = ['contraparte', 'plano de contas']
+
+def compactar_colunas(df, colunas=COLUNAS_CATEGORICAS):
+    """
+    Converte para categoria as colunas de texto repetitivo presentes no DataFrame
+    Feito sobre o arquivo inteiro (depois de juntar_blocos), para que todos os
+    blocos compartilhem as mesmas categorias
+    """
+    categoricas = {
+        coluna: df[coluna].astype('category')
+        for coluna in colunas
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype)
+    }
+    if not categoricas:
+        return df
+    return df.assign(**categoricas)
 
 def ordernar_arquivo(df):
+    """
+    Ordena o arquivo pela coluna 'data' já convertida (normalizar_datas)
+    Datas inválidas ficam no início, como antes
+    """
+    df = df.assign(data=normalizar_datas(df['data']))
     
-    def formatacao_data(data):
-        try:
-            # Supondo formato DD/MM/YYYY
-            if '/' in str(data):
-                dia, mes, ano = str(data).split('/')
-                return f"{ano}{mes.zfill(2)}{dia.zfill(2)}"
-            # Se já estiver em outro formato, retorna original
-            return str(data)
-        except:
-            return "00000000"  # Para datas inválidas
-    
-    df['_ordenar'] = df['data'].apply(formatacao_data)
-    
-    # Ordenar
-    df = df.sort_values(by='_ordenar')
-    
-    # Remover coluna auxiliar
-    df = df.drop(columns=['_ordenar'])
+    # Ordenar (estável, para manter a ordem original dentro do mesmo dia)
+    df = df.sort_values(by='data', kind='stable', na_position='first')
     
     # Resetar índice
     df = df.reset_index(drop=True)
     
     return df
 
-def converter_valor_reais(valor_str):
+def normalizar_datas(serie):
     """
-    Converte strings do formato '-R$ 497,21' para float
-    Trata automaticamente o sinal negativo
+    Converte uma coluna de datas para datetime64, uma única vez na leitura
+    Aceita, inclusive misturados na mesma coluna:
+    - textos no formato brasileiro DD/MM/YYYY (ou ISO, YYYY-MM-DD)
+    - números de série do Excel (dias desde 30/12/1899)
+    - datas já lidas pelo Excel
+    Datas inválidas viram NaT. Se a coluna já for datetime64, é devolvida como está
     """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    
+    # Coluna só com números de série do Excel
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_datetime(serie, unit='D', origin='1899-12-30', errors='coerce')
+    
+    # Identifica quais células são texto
     try:
-        valor_str = str(valor_str).strip()
-        
-        # Verifica se tem sinal negativo
-        if valor_str.startswith('-'):
-            sinal = -1
-            valor_limpo = valor_str[1:]  # Remove o '-'
-        else:
-            sinal = 1
-            valor_limpo = valor_str
-        
-        # Remove 'R$' e espaços extras
-        valor_limpo = valor_limpo.replace('R$', '').strip()
-        
-        # Remove pontos (separadores de milhar)
-        valor_limpo = valor_limpo.replace('.', '')
-        
-        # Substitui vírgula por ponto (decimal)
-        valor_limpo = valor_limpo.replace(',', '.')
-        
-        # Converte para float e aplica sinal
-        return float(valor_limpo) * sinal
-        
-    except (ValueError, AttributeError, TypeError):
-        return None
+        eh_texto = serie.str.len().notna()
+    except AttributeError:
+        eh_texto = pd.Series(False, index=serie.index)
+    
+    # Textos: primeiro DD/MM/YYYY, depois ISO
+    texto = serie.where(eh_texto).str.strip()
+    datas = pd.to_datetime(texto, format='%d/%m/%Y', errors='coerce')
+    faltam = datas.isna() & eh_texto
+    if faltam.any():
+        datas = datas.fillna(pd.to_datetime(texto.where(faltam), format='ISO8601', errors='coerce'))
+    
+    # Números de série do Excel no meio de uma coluna de texto
+    numeros = pd.to_numeric(serie.where(~eh_texto), errors='coerce')
+    if numeros.notna().any():
+        datas = datas.fillna(pd.to_datetime(numeros, unit='D', origin='1899-12-30', errors='coerce'))
+    
+    # Células que já vieram como data
+    objetos = ~eh_texto & numeros.isna() & serie.notna()
+    if objetos.any():
+        datas = datas.fillna(pd.to_datetime(serie.where(objetos), errors='coerce'))
+    
+    return datas
+
+def formatar_datas(serie):
+    """
+    Formata uma coluna datetime64 no padrão brasileiro DD/MM/YYYY
+    Usado apenas na saída (relatório); datas vazias viram ''
+    """
+    return normalizar_datas(serie).dt.strftime('%d/%m/%Y').fillna('')
+
+def _dias(datas):
+    """Converte datas para número de dias (ordinal inteiro), usado nas comparações"""
+    return normalizar_datas(datas).to_numpy(dtype='datetime64[D]').astype('int64')
 
-def contar_movimentacoes(df, coluna_valor='valor_convertido'):  
+def contar_movimentacoes(df, coluna_valor='valor_centavos'):  
     """
     Conta movimentações, entradas e saídas excluindo linhas com descrição igual a 'SALDO' e derivadas disso
     
     Returns:
-        tuple: (total_movimentacoes, soma_total)
+        tuple: (total_movimentacoes, soma_total em centavos)
     """
     
     df_movimentacoes = df
@@ -286,35 +379,22 @@ def contar_movimentacoes(df, coluna_valor='valor_convertido'):
         #saidas = len(df_movimentacoes[df_movimentacoes[coluna_valor] < 0])
         total_valor = df_movimentacoes[coluna_valor]
 
-    soma_total = total_valor.sum()
+    soma_total = int(total_valor.sum())
     
     return total_movimentacoes, soma_total
 
-def conciliacao_simples(df_extrato, df_controle):
+def _parear_laco(df_e, df_c):
     """
-    Compara os valores e datas dos dois dataframes e retorna um dataframe conciliado
-    Garante que cada valor converja com apenas um outro valor
-    
-    Args:
-        df_extrato: DataFrame do extrato bancário
-        df_controle: DataFrame do controle financeiro
+    Motor de referência: percorre os dois lados ordenados por valor,
+    pareando cada valor do extrato com o primeiro igual ainda livre no controle
+    Mantido apenas para comparação com os motores vetorizados (O(n·m) no pior caso)
     
     Returns:
-        DataFrame com as colunas de conciliação
+        DataFrame com os pares (_id_extrato, _id_controle)
     """
-    
-    # Prepara os dataframes
-    df_e = df_extrato[['data', 'documento', 'descricao', 'valor_convertido']].copy()
-    df_e.columns = ['data_extrato', 'documento_extrato', 'descricao_extrato', 'valor_extrato']
-    
-    df_c = df_controle[['data', 'descricao', 'contraparte', 'plano de contas', 'valor_convertido']].copy()
-    df_c.columns = ['data_controle', 'recurso_controle', 'contraparte_controle', 'plano de contas_controle', 'valor_controle']
-    
-    # Resetar índices para IDs únicos
-    df_e = df_e.reset_index(drop=True).reset_index().rename(columns={'index': '_id_extrato'})
-    df_c = df_c.reset_index(drop=True).reset_index().rename(columns={'index': '_id_controle'})
-    
     # Criar colunas auxiliares para marcar matches
+    df_e = df_e[['_id_extrato', 'valor_extrato']].copy()
+    df_c = df_c[['_id_controle', 'valor_controle']].copy()
     df_e['_matched'] = False
     df_c['_matched'] = False
     
@@ -356,108 +436,647 @@ def conciliacao_simples(df_extrato, df_controle):
             # Se não encontrou match, avançar para próximo no extrato
             c_index = 0  # Resetar busca no controle
     
-    # AGORA CRIAR O DATAFRAME FINAL COM TODAS AS LINHAS
-    
-    # 1. Começar com todos os matches
-    matches_df = pd.DataFrame(matches) if matches else pd.DataFrame(
+    return pd.DataFrame(matches) if matches else pd.DataFrame(
         columns=['_id_extrato', '_id_controle']
     )
+
+def _parear_hash(df_e, df_c):
+    """
+    Motor vetorizado: numera as ocorrências de cada valor (na ordem dos IDs)
+    e faz um hash join por (valor, ocorrência)
+    O k-ésimo lançamento de um valor no extrato pareia com o k-ésimo do mesmo
+    valor no controle, exatamente como no motor de referência, em O(n + m)
     
-    # 2. Criar dataframe com todas as linhas do extrato (com ou sem match)
-    df_result_e = pd.merge(
-        df_e[['_id_extrato', 'data_extrato', 'documento_extrato', 'descricao_extrato', 'valor_extrato']],
-        matches_df,
-        on='_id_extrato',
-        how='left'
-    )
+    Returns:
+        DataFrame com os pares (_id_extrato, _id_controle)
+    """
+    e = df_e.loc[df_e['valor_extrato'].notna(), ['_id_extrato', 'valor_extrato']]
+    c = df_c.loc[df_c['valor_controle'].notna(), ['_id_controle', 'valor_controle']]
     
-    # 3. Adicionar dados do controle para as que têm match
-    df_result = pd.merge(
-        df_result_e,
-        df_c[['_id_controle', 'data_controle', 'recurso_controle', 'contraparte_controle', 'plano de contas_controle', 'valor_controle']],
-        on='_id_controle',
-        how='left'
-    )
+    # Ocorrência de cada valor, na ordem dos IDs
+    e = e.assign(_ocorrencia=e.groupby('valor_extrato').cumcount())
+    c = c.assign(_ocorrencia=c.groupby('valor_controle').cumcount())
     
-    # 4. Adicionar as linhas do controle que NÃO foram usadas em nenhum match
-    # Primeiro, identificar IDs do controle que não foram usados
-    ids_controle_usados = matches_df['_id_controle'].dropna().unique()
-    linhas_controle_nao_usadas = df_c[~df_c['_id_controle'].isin(ids_controle_usados)].copy()
-    
-    # Criar DataFrame para as linhas não usadas do controle
-    if not linhas_controle_nao_usadas.empty:
-        df_controle_sem_match = pd.DataFrame({
-            'data_extrato': [None] * len(linhas_controle_nao_usadas),
-            'descricao_extrato': [None] * len(linhas_controle_nao_usadas),
-            'documento_extrato': [None] * len(linhas_controle_nao_usadas),
-            'valor_extrato': [None] * len(linhas_controle_nao_usadas),
-            '_id_extrato': [None] * len(linhas_controle_nao_usadas),
-            '_id_controle': linhas_controle_nao_usadas['_id_controle'].values,
-            'data_controle': linhas_controle_nao_usadas['data_controle'].values,
-            'recurso_controle': linhas_controle_nao_usadas['recurso_controle'].values,
-            'contraparte_controle': linhas_controle_nao_usadas['contraparte_controle'].values,
-            'plano de contas_controle': linhas_controle_nao_usadas['plano de contas_controle'].values,
-            'valor_controle': linhas_controle_nao_usadas['valor_controle'].values
-        })
-        
-        # Concatenar com os resultados anteriores
-        df_result = pd.concat([df_result, df_controle_sem_match], ignore_index=True)
-    
-    # Remover colunas auxiliares
-    df_result = df_result.drop(columns=['_id_extrato', '_id_controle'], errors='ignore')
-    
-    # Cria status - IMPORTANTE: considerar todas as combinações
-    df_result['status_conciliacao'] = df_result.apply(
-        lambda x: "CONCILIADA" if (
-            pd.notna(x.get('descricao_extrato')) and 
-            (pd.notna(x.get('recurso_controle')) or pd.notna(x.get('contraparte_controle')))
-        ) else "NÃO CONCILIADO",
-        axis=1
+    pares = pd.merge(
+        e,
+        c,
+        left_on=['valor_extrato', '_ocorrencia'],
+        right_on=['valor_controle', '_ocorrencia'],
+        how='inner'
     )
     
-    # Reordenar colunas para melhor visualização
-    col_order = [
-        'data_extrato', 'documento_extrato', 'descricao_extrato', 'valor_extrato',
-        'data_controle', 'recurso_controle', 'contraparte_controle', 'plano de contas_controle', 'valor_controle',
-        'status_conciliacao'
-    ]
+    return pares[['_id_extrato', '_id_controle']]
+
+def _parear_janela(df_e, df_c, janela_dias):
+    """
+    Motor por valor e data: só pareia lançamentos de mesmo valor cujas datas
+    estejam a no máximo `janela_dias` dias uma da outra
+    Cada lançamento do extrato fica com o lançamento livre do controle de mesmo
+    valor e data mais próxima (o mesmo dia antes de qualquer outro). Valor e dia
+    são combinados numa única chave ordenada, e cada distância de 0 a janela_dias
+    é resolvida por searchsorted: O(janela_dias · n log n)
+    
+    Returns:
+        DataFrame com os pares (_id_extrato, _id_controle)
+    """
+    e = df_e.loc[df_e['valor_extrato'].notna(), ['_id_extrato', 'valor_extrato', 'data_extrato']]
+    c = df_c.loc[df_c['valor_controle'].notna(), ['_id_controle', 'valor_controle', 'data_controle']]
+    
+    datas_e = normalizar_datas(e['data_extrato'])
+    datas_c = normalizar_datas(c['data_controle'])
+    e = e[datas_e.notna().to_numpy()]
+    c = c[datas_c.notna().to_numpy()]
+    
+    if e.empty or c.empty:
+        return pd.DataFrame(columns=['_id_extrato', '_id_controle'])
+    
+    dias_e = _dias(datas_e[datas_e.notna()])
+    dias_c = _dias(datas_c[datas_c.notna()])
     
-    # Garantir que todas as colunas existam
-    col_order = [col for col in col_order if col in df_result.columns]
+    # Código comum de valor para os dois lados
+    codigos, _ = pd.factorize(pd.concat([e['valor_extrato'], c['valor_controle']], ignore_index=True))
+    codigo_e = codigos[:len(e)].astype('int64')
+    codigo_c = codigos[len(e):].astype('int64')
     
-    return df_result[col_order]
+    # Chave única (valor, dia): a folga de 2 janelas impede que a janela
+    # de um valor alcance o valor vizinho
+    dia_min = min(dias_e.min(), dias_c.min())
+    largura = int(max(dias_e.max(), dias_c.max()) - dia_min) + 2 * janela_dias + 1
+    chave_e = codigo_e * largura + (dias_e - dia_min + janela_dias)
+    chave_c = codigo_c * largura + (dias_c - dia_min + janela_dias)
+    
+    # Ordena por chave e, no empate, pelo ID
+    ids_e = e['_id_extrato'].to_numpy()
+    ids_c = c['_id_controle'].to_numpy()
+    ordem_e = np.lexsort((ids_e, chave_e))
+    ordem_c = np.lexsort((ids_c, chave_c))
+    chave_e, ids_e = chave_e[ordem_e], ids_e[ordem_e]
+    chave_c, ids_c = chave_c[ordem_c], ids_c[ordem_c]
+    
+    # Da data mais próxima para a mais distante: primeiro o mesmo dia, depois
+    # ±1 dia (o controle anterior antes do posterior) e assim até a janela
+    # Em cada distância, a k-ésima ocorrência de uma chave livre do extrato
+    # pareia com a k-ésima chave livre do controle deslocada daquela distância
+    livre_e = np.ones(len(chave_e), dtype=bool)
+    livre_c = np.ones(len(chave_c), dtype=bool)
+    pares_e, pares_c = [], []
+    for distancia in range(janela_dias + 1):
+        for deslocamento in ((0,) if distancia == 0 else (-distancia, distancia)):
+            posicoes_e = np.flatnonzero(livre_e)
+            posicoes_c = np.flatnonzero(livre_c)
+            if len(posicoes_e) == 0 or len(posicoes_c) == 0:
+                break
+            alvo = chave_e[posicoes_e] + deslocamento
+            livres_c = chave_c[posicoes_c]
+            
+            # Ocorrência de cada chave do extrato (ordenado por chave e ID)
+            ocorrencia = np.arange(len(alvo)) - np.searchsorted(alvo, alvo, side='left')
+            inicio = np.searchsorted(livres_c, alvo, side='left')
+            fim = np.searchsorted(livres_c, alvo, side='right')
+            pareia = ocorrencia < fim - inicio
+            
+            escolhidos_e = posicoes_e[pareia]
+            escolhidos_c = posicoes_c[(inicio + ocorrencia)[pareia]]
+            livre_e[escolhidos_e] = False
+            livre_c[escolhidos_c] = False
+            pares_e.append(ids_e[escolhidos_e])
+            pares_c.append(ids_c[escolhidos_c])
+    
+    if not pares_e:
+        return pd.DataFrame(columns=['_id_extrato', '_id_controle'])
+    return pd.DataFrame({'_id_extrato': np.concatenate(pares_e), '_id_controle': np.concatenate(pares_c)})
 
-def ordenar_por_data_br(lista_dados, campo_data='data'):
-        """Ordena lista de dicionários por data no formato brasileiro DD/MM/YYYY"""
-        def chave_ordenacao(item):
-            data_str = item.get(campo_data, '')
-            if not data_str:
-                return (1, '')  # Datas vazias vão para o final
+def _buscar_subconjunto(alvo, valores, max_itens, prazo):
+    """
+    Procura até `max_itens` posições de `valores` cuja soma seja exatamente `alvo`
+    Todos os valores têm o mesmo sinal do alvo e estão ordenados do maior para
+    o menor (em módulo); a busca é em profundidade com poda pela soma máxima
+    ainda alcançável e tenta primeiro os grupos menores
+    
+    Returns:
+        Lista de posições do grupo encontrado, ou None
+    
+    Raises:
+        TimeoutError: se o prazo da execução for ultrapassado
+    """
+    n = len(valores)
+    
+    def busca(inicio, restante, faltam, escolhidos):
+        if time.perf_counter() > prazo:
+            raise TimeoutError
+        if restante == 0:
+            return faltam == 0 and escolhidos
+        if faltam == 0:
+            return None
+        for i in range(inicio, n - faltam + 1):
+            v = valores[i]
+            if v > restante:
+                continue
+            # Nem os maiores valores restantes alcançam o que falta
+            if v * faltam < restante:
+                break
+            encontrado = busca(i + 1, restante - v, faltam - 1, escolhidos + [i])
+            if encontrado:
+                return encontrado
+        return None
+    
+    for tamanho in range(2, min(max_itens, n) + 1):
+        encontrado = busca(0, alvo, tamanho, [])
+        if encontrado:
+            return encontrado
+    return None
+
+def _parear_agrupado(df_e, df_c, pares, max_itens=4, janela_dias=5, tempo_limite=5.0, max_candidatos=30):
+    """
+    Segunda passada sobre as sobras da conciliação 1:1: procura grupos de até
+    `max_itens` lançamentos de um lado cuja soma seja exatamente um lançamento
+    do outro lado (ex.: um depósito = várias entradas do controle), com datas
+    dentro de `janela_dias`
+    Cada alvo considera no máximo `max_candidatos` lançamentos mais próximos
+    na data, e a passada inteira respeita o limite de `tempo_limite` segundos
+    
+    Returns:
+        tuple: (DataFrame com os pares (_id_extrato, _id_controle, grupo_conciliacao),
+                True se o limite de tempo interrompeu a busca)
+    """
+    prazo = time.perf_counter() + tempo_limite
+    usados_e = set(pares['_id_extrato'].dropna().astype('int64'))
+    usados_c = set(pares['_id_controle'].dropna().astype('int64'))
+    
+    def livres(df, col_id, col_valor, col_data, usados):
+        df = df[~df[col_id].isin(usados) & df[col_valor].notna() & (df[col_valor] != 0)]
+        df = df.assign(_dia=normalizar_datas(df[col_data]))
+        df = df[df['_dia'].notna()]
+        df = df.sort_values('_dia', kind='stable')
+        return (
+            df[col_id].to_numpy(dtype='int64'),
+            df[col_valor].to_numpy(dtype='int64'),
+            df['_dia'].to_numpy(dtype='datetime64[D]').astype('int64'),
+        )
+    
+    grupos = []
+    interrompido = False
+    
+    # Um extrato = vários do controle; depois um controle = vários do extrato
+    direcoes = [
+        (df_e, '_id_extrato', 'valor_extrato', 'data_extrato', usados_e,
+         df_c, '_id_controle', 'valor_controle', 'data_controle', usados_c, True),
+        (df_c, '_id_controle', 'valor_controle', 'data_controle', usados_c,
+         df_e, '_id_extrato', 'valor_extrato', 'data_extrato', usados_e, False),
+    ]
+    try:
+        for (df_alvo, id_alvo, valor_alvo, data_alvo, usados_alvo,
+             df_cand, id_cand, valor_cand, data_cand, usados_cand, alvo_no_extrato) in direcoes:
+            ids_a, valores_a, dias_a = livres(df_alvo, id_alvo, valor_alvo, data_alvo, usados_alvo)
+            ids_c, valores_c, dias_c = livres(df_cand, id_cand, valor_cand, data_cand, usados_cand)
+            if len(ids_c) < 2:
+                continue
+            disponivel = np.ones(len(ids_c), dtype=bool)
             
-            try:
-                # Converte DD/MM/YYYY para tuple (ano, mes, dia) para ordenação
-                partes = data_str.split('/')
-                if len(partes) == 3:
-                    dia, mes, ano = partes
-                    # Extrai valor numérico para desempate
-                    valor = 0
-                    if 'valor' in item:
-                        valor_str = str(item['valor'])
-                        # Se o valor já for numérico
-                        if isinstance(item['valor'], (int, float)):
-                            valor = float(item['valor'])
-                        else:
-                            # Tenta extrair de string formatada "R$ 1.234,56"
-                            try:
-                                valor_limpo = valor_str.replace('R$', '').replace('.', '').replace(',', '.').strip()
-                                valor = float(valor_limpo)
-                            except:
-                                valor = 0
-                    
-                    return (0, ano, mes, dia, valor)
-            except:
-                pass
+            # Faixa de candidatos dentro da janela de cada alvo
+            inicios = np.searchsorted(dias_c, dias_a - janela_dias, side='left')
+            fins = np.searchsorted(dias_c, dias_a + janela_dias, side='right')
             
-            return (1, 9999, 13, 32, float('inf')) # Para datas inválidas
-        
-        return sorted(lista_dados, key=chave_ordenacao)
\ No newline at end of file
+            for k in range(len(ids_a)):
+                # O prazo vale para a passada inteira, não só para a busca de cada alvo
+                if time.perf_counter() > prazo:
+                    raise TimeoutError
+                if fins[k] - inicios[k] < 2:
+                    continue
+                alvo = int(valores_a[k])
+                faixa = np.arange(inicios[k], fins[k])
+                faixa = faixa[
+                    (np.sign(valores_c[faixa]) == np.sign(alvo))
+                    & (np.abs(valores_c[faixa]) <= abs(alvo))
+                    & disponivel[faixa]
+                ]
+                if len(faixa) < 2:
+                    continue
+                
+                # Mais próximos na data primeiro; depois, do maior para o menor
+                faixa = faixa[np.argsort(np.abs(dias_c[faixa] - dias_a[k]), kind='stable')[:max_candidatos]]
+                faixa = faixa[np.argsort(-np.abs(valores_c[faixa]), kind='stable')]
+                
+                encontrado = _buscar_subconjunto(abs(alvo), np.abs(valores_c[faixa]).tolist(), max_itens, prazo)
+                if encontrado:
+                    grupo = len(grupos) + 1
+                    for pos in encontrado:
+                        id_c = int(ids_c[faixa[pos]])
+                        disponivel[faixa[pos]] = False
+                        usados_cand.add(id_c)
+                        if alvo_no_extrato:
+                            grupos.append((int(ids_a[k]), id_c, grupo))
+                        else:
+                            grupos.append((id_c, int(ids_a[k]), grupo))
+                    usados_alvo.add(int(ids_a[k]))
+    except TimeoutError:
+        interrompido = True
+    
+    # Numeração sequencial dos grupos (cada grupo tem várias linhas)
+    df_grupos = pd.DataFrame(grupos, columns=['_id_extrato', '_id_controle', 'grupo_conciliacao'])
+    df_grupos['grupo_conciliacao'] = pd.factorize(df_grupos['grupo_conciliacao'])[0] + 1
+    
+    return df_grupos, interrompido
+
+def normalizar_texto(serie):
+    """
+    Normaliza textos para comparação: remove acentos, passa para maiúsculo
+    e troca pontuação por espaço
+    Exemplo: "Pagamento João-Silva" -> "PAGAMENTO JOAO SILVA"
+    """
+    return (
+        serie.fillna('').astype(str)
+        .str.normalize('NFKD')
+        .str.encode('ascii', errors='ignore')
+        .str.decode('ascii')
+        .str.upper()
+        .str.replace(r'[^A-Z0-9]+', ' ', regex=True)
+        .str.strip()
+    )
+
+def construir_indice_textual(textos, tamanho_ngrama=3):
+    """
+    Monta o índice invertido de n-gramas de caracteres dos textos
+    Textos repetidos (muito comuns em extratos) são indexados uma única vez;
+    cada palavra é cercada por espaços antes de ser quebrada, então palavras
+    curtas também geram n-gramas. O custo é linear no tamanho dos textos
+    
+    Args:
+        textos: Series com os textos (o índice da Series identifica o documento)
+        tamanho_ngrama: Número de caracteres de cada n-grama
+    
+    Returns:
+        dict com:
+            'documentos': Series documento -> código do texto
+            'ngramas': DataFrame sem repetições com as colunas (texto, ngrama)
+            'tamanhos': quantidade de n-gramas distintos por código de texto
+    """
+    normalizados = normalizar_texto(textos)
+    codigos, unicos = pd.factorize(normalizados)
+    documentos = pd.Series(codigos, index=textos.index)
+    
+    palavras = pd.Series(unicos).str.split().explode().dropna()
+    palavras = ' ' + palavras + ' '
+    
+    # Palavras mais longas primeiro: as que têm n-grama num deslocamento formam um
+    # prefixo da Series, recortado sem cópia; um único slice por deslocamento
+    comprimento = palavras.str.len().to_numpy()
+    ordem = np.argsort(-comprimento, kind='stable')
+    palavras, comprimento = palavras.iloc[ordem], comprimento[ordem]
+    fins = np.arange(tamanho_ngrama, comprimento.max() + 1 if len(palavras) else 0)
+    quantidades = np.searchsorted(-comprimento, -fins, side='right')
+    partes = [
+        palavras.iloc[:quantidade].str.slice(inicio, inicio + tamanho_ngrama)
+        for inicio, quantidade in enumerate(quantidades)
+    ]
+    
+    if partes:
+        ngramas = pd.concat(partes)
+        ngramas = pd.DataFrame({'texto': ngramas.index.to_numpy(), 'ngrama': ngramas.array}).drop_duplicates()
+    else:
+        ngramas = pd.DataFrame(columns=['texto', 'ngrama'])
+    
+    return {
+        'documentos': documentos,
+        'ngramas': ngramas,
+        'tamanhos': ngramas.groupby('texto').size(),
+    }
+
+def pontuar_pares(indice_e, indice_c, pares):
+    """
+    Calcula a similaridade (Jaccard dos n-gramas) de vários pares de uma vez
+    Cada combinação distinta de textos é pontuada uma única vez
+    
+    Args:
+        indice_e: Índice textual do extrato (construir_indice_textual)
+        indice_c: Índice textual do controle
+        pares: DataFrame com as colunas (_id_extrato, _id_controle)
+    
+    Returns:
+        Series de floats entre 0 e 1, alinhada com `pares`
+    """
+    textos = pd.DataFrame({
+        'texto_e': pares['_id_extrato'].map(indice_e['documentos']).to_numpy(),
+        'texto_c': pares['_id_controle'].map(indice_c['documentos']).to_numpy(),
+    }, index=pares.index)
+    combinacoes = textos.drop_duplicates().reset_index(drop=True)
+    
+    # n-gramas em comum: junta cada combinação aos n-gramas do extrato e
+    # depois procura o mesmo n-grama no índice do controle
+    comuns = (
+        combinacoes.reset_index()
+        .merge(indice_e['ngramas'], left_on='texto_e', right_on='texto')
+        .merge(indice_c['ngramas'], left_on=['texto_c', 'ngrama'], right_on=['texto', 'ngrama'])
+        .groupby('index')
+        .size()
+    )
+    intersecao = comuns.reindex(combinacoes.index, fill_value=0).to_numpy()
+    
+    tam_e = combinacoes['texto_e'].map(indice_e['tamanhos']).fillna(0).to_numpy()
+    tam_c = combinacoes['texto_c'].map(indice_c['tamanhos']).fillna(0).to_numpy()
+    uniao = tam_e + tam_c - intersecao
+    combinacoes['_pontuacao'] = np.where(uniao > 0, intersecao / np.maximum(uniao, 1), 0.0)
+    
+    pontuacao = textos.merge(combinacoes, on=['texto_e', 'texto_c'], how='left')['_pontuacao']
+    
+    return pd.Series(pontuacao.to_numpy(), index=pares.index)
+
+def _parear_texto(df_e, df_c, limite_pares_grupo=2500):
+    """
+    Motor por valor com desempate pela descrição: quando há mais de um
+    lançamento com o mesmo valor, pareia primeiro os de descrição mais parecida
+    (descrição do extrato contra recurso + contraparte do controle)
+    Grupos grandes demais (mais de `limite_pares_grupo` combinações) usam
+    a ordem dos IDs, como o motor 'hash'
+    
+    Returns:
+        DataFrame com os pares (_id_extrato, _id_controle)
+    """
+    e = df_e.loc[df_e['valor_extrato'].notna()]
+    c = df_c.loc[df_c['valor_controle'].notna()]
+    
+    # Tamanho de cada grupo de valor nos dois lados
+    qtd_e = e['valor_extrato'].map(e['valor_extrato'].value_counts())
+    qtd_c = e['valor_extrato'].map(c['valor_controle'].value_counts()).fillna(0)
+    combinacoes = qtd_e * qtd_c
+    valores_desempate = e.loc[(combinacoes > 1) & (combinacoes <= limite_pares_grupo), 'valor_extrato'].unique()
+    
+    # Valores sem empate (ou com grupos enormes) seguem a ordem dos IDs
+    pares_diretos = _parear_hash(
+        e[~e['valor_extrato'].isin(valores_desempate)],
+        c[~c['valor_controle'].isin(valores_desempate)]
+    )
+    
+    e = e[e['valor_extrato'].isin(valores_desempate)]
+    c = c[c['valor_controle'].isin(valores_desempate)]
+    if e.empty:
+        return pares_diretos
+    
+    # Todas as combinações dentro de cada grupo de valor
+    candidatos = pd.merge(
+        e[['_id_extrato', 'valor_extrato']],
+        c[['_id_controle', 'valor_controle']],
+        left_on='valor_extrato',
+        right_on='valor_controle'
+    )[['_id_extrato', '_id_controle']]
+    
+    # Índices construídos uma única vez para o lote inteiro
+    # A contraparte pode ser categórica: vira texto antes de preencher os vazios
+    texto_c = (
+        c['recurso_controle'].fillna('').astype(str) + ' '
+        + c['contraparte_controle'].astype(object).fillna('').astype(str)
+    )
+    indice_e = construir_indice_textual(e.set_index('_id_extrato')['descricao_extrato'])
+    indice_c = construir_indice_textual(texto_c.set_axis(c['_id_controle']))
+    candidatos['_pontuacao'] = pontuar_pares(indice_e, indice_c, candidatos).to_numpy()
+    
+    # Guloso: maior pontuação primeiro; no empate, ordem dos IDs
+    candidatos = candidatos.sort_values(
+        ['_pontuacao', '_id_extrato', '_id_controle'],
+        ascending=[False, True, True],
+        kind='stable'
+    )
+    usados_e, usados_c = set(), set()
+    pares_e, pares_c = [], []
+    for id_e, id_c in zip(candidatos['_id_extrato'].tolist(), candidatos['_id_controle'].tolist()):
+        if id_e in usados_e or id_c in usados_c:
+            continue
+        usados_e.add(id_e)
+        usados_c.add(id_c)
+        pares_e.append(id_e)
+        pares_c.append(id_c)
+    
+    pares_texto = pd.DataFrame({'_id_extrato': pares_e, '_id_controle': pares_c})
+    
+    return pd.concat([pares_diretos, pares_texto], ignore_index=True)
+
+# Motores de pareamento disponíveis para a conciliação simples
+MOTORES_CONCILIACAO = {
+    'hash': _parear_hash,
+    'texto': _parear_texto,
+    'laco': _parear_laco,
+}
+
+# Colunas de cada lado usadas na conciliação e seus nomes no resultado
+COLUNAS_EXTRATO = {
+    'data': 'data_extrato',
+    'documento': 'documento_extrato',
+    'descricao': 'descricao_extrato',
+    'valor_centavos': 'valor_extrato',
+}
+COLUNAS_CONTROLE = {
+    'data': 'data_controle',
+    'descricao': 'recurso_controle',
+    'contraparte': 'contraparte_controle',
+    'plano de contas': 'plano de contas_controle',
+    'valor_centavos': 'valor_controle',
+}
+
+def parear_conciliacao(df_extrato, df_controle, motor='hash', janela_dias=None,
+                       agrupar=False, max_itens=4, janela_grupo_dias=5, tempo_limite=5.0):
+    """
+    Pareamento da conciliação em forma compacta: apenas os IDs (posições) das linhas
+    pareadas e das sem par, sem montar a tabela larga do resultado
+    As tabelas (resultado completo, conciliadas, divergentes) e a contagem por status
+    são montadas sob demanda a partir dele (tabela_conciliacao, linhas_por_status,
+    contagem_status)
+    
+    Args:
+        df_extrato: DataFrame do extrato bancário
+        df_controle: DataFrame do controle financeiro
+        motor, janela_dias, agrupar, max_itens, janela_grupo_dias, tempo_limite:
+            ver conciliacao_simples
+    
+    Returns:
+        dict com:
+        - 'extrato', 'controle': as colunas usadas de cada lado, já renomeadas
+          (sem cópia dos dados), com o ID como índice
+        - 'pares': DataFrame (_id_extrato, _id_controle e, nos grupos,
+          grupo_conciliacao), ordenado pelo ID do extrato
+        - 'extrato_sem_par', 'controle_sem_par': IDs (np.ndarray) das linhas sem par
+        - 'agrupamento_interrompido': se o limite de tempo do agrupamento foi atingido
+    """
+    if motor not in MOTORES_CONCILIACAO:
+        raise ValueError(f"Motor de conciliação desconhecido: {motor}")
+    
+    # Prepara os dataframes: seleção e renomeação sem copiar os dados das entradas
+    # O índice passa a ser a posição da linha, igual ao ID usado nos pares
+    df_e = df_extrato[list(COLUNAS_EXTRATO)].rename(columns=COLUNAS_EXTRATO).reset_index(drop=True)
+    df_c = df_controle[list(COLUNAS_CONTROLE)].rename(columns=COLUNAS_CONTROLE).reset_index(drop=True)
+    df_e.insert(0, '_id_extrato', np.arange(len(df_e)))
+    df_c.insert(0, '_id_controle', np.arange(len(df_c)))
+    
+    # Fazer matching 1:1
+    if janela_dias is not None:
+        matches_df = _parear_janela(df_e, df_c, int(janela_dias))
+    else:
+        matches_df = MOTORES_CONCILIACAO[motor](df_e, df_c)
+    
+    # Segunda passada: grupos de vários lançamentos para um
+    interrompido = False
+    if agrupar:
+        grupos_df, interrompido = _parear_agrupado(
+            df_e, df_c, matches_df, max_itens, janela_grupo_dias, tempo_limite
+        )
+        if not grupos_df.empty:
+            matches_df = pd.concat([matches_df, grupos_df], ignore_index=True)
+    
+    # IDs inteiros, na ordem do extrato (estável: nos grupos, mantém a ordem encontrada)
+    pares = matches_df.astype({'_id_extrato': 'int64', '_id_controle': 'int64'})
+    pares = pares.sort_values('_id_extrato', kind='stable').reset_index(drop=True)
+    if 'grupo_conciliacao' in pares.columns:
+        pares['grupo_conciliacao'] = pares['grupo_conciliacao'].astype('Int64')
+    
+    return {
+        'extrato': df_e.drop(columns='_id_extrato'),
+        'controle': df_c.drop(columns='_id_controle'),
+        'pares': pares,
+        'extrato_sem_par': np.setdiff1d(np.arange(len(df_e)), pares['_id_extrato'].to_numpy()),
+        'controle_sem_par': np.setdiff1d(np.arange(len(df_c)), pares['_id_controle'].to_numpy()),
+        'agrupamento_interrompido': interrompido,
+    }
+
+def linhas_conciliacao(resultado):
+    """
+    Linhas do resultado da conciliação como IDs, na ordem da tabela completa:
+    as linhas do extrato (com o par, se houver) e, no final, as do controle sem par
+    -1 indica que a linha não tem aquele lado; nos grupos, o lançamento que se
+    repete aparece só na primeira linha
+    
+    Returns:
+        tuple: (IDs do extrato, IDs do controle, grupo_conciliacao ou None)
+    """
+    pares = resultado['pares']
+    sem_par_e = resultado['extrato_sem_par']
+    sem_par_c = resultado['controle_sem_par']
+    
+    # Pares e linhas do extrato sem par intercalados pelo ID do extrato
+    ids_e = np.concatenate([pares['_id_extrato'].to_numpy(dtype='int64'), sem_par_e])
+    ids_c = np.concatenate([pares['_id_controle'].to_numpy(dtype='int64'), np.full(len(sem_par_e), -1)])
+    ordem = np.argsort(ids_e, kind='stable')
+    ids_e, ids_c = ids_e[ordem], ids_c[ordem]
+    
+    # Controle sem par no final
+    ids_e = np.concatenate([ids_e, np.full(len(sem_par_c), -1)])
+    ids_c = np.concatenate([ids_c, sem_par_c])
+    
+    grupos = None
+    if 'grupo_conciliacao' in pares.columns:
+        grupo_par = pares['grupo_conciliacao'].to_numpy(dtype='float64', na_value=np.nan)
+        grupos = np.concatenate([grupo_par, np.full(len(sem_par_e), np.nan)])[ordem]
+        grupos = pd.array(np.concatenate([grupos, np.full(len(sem_par_c), np.nan)]), dtype='Int64')
+    
+    # Nos grupos, o lançamento que se repete aparece só na primeira linha
+    ids_e = np.where((ids_e >= 0) & pd.Series(ids_e).duplicated().to_numpy(), -1, ids_e)
+    ids_c = np.where((ids_c >= 0) & pd.Series(ids_c).duplicated().to_numpy(), -1, ids_c)
+    
+    return ids_e, ids_c, grupos
+
+def montar_linhas(resultado, ids_e, ids_c, grupos=None):
+    """
+    Colunas do extrato e do controle nas linhas indicadas pelos IDs
+    (-1 = lado vazio na linha; as colunas mantêm os tipos)
+    """
+    df_linhas = pd.concat(
+        [
+            resultado['extrato'].reindex(ids_e).reset_index(drop=True),
+            resultado['controle'].reindex(ids_c).reset_index(drop=True),
+        ],
+        axis=1
+    )
+    if grupos is not None:
+        df_linhas['grupo_conciliacao'] = grupos
+    return df_linhas
+
+def _conciliadas(resultado, ids_e, ids_c, grupos):
+    """
+    Status de cada linha, vetorizado: conciliada quando tem descrição do extrato e
+    descrição ou contraparte do controle, ou quando faz parte de um grupo
+    """
+    def presente(df, coluna, ids):
+        valores = df[coluna].notna().to_numpy(dtype=bool)
+        return (ids >= 0) & valores[np.maximum(ids, 0)] if len(valores) else np.zeros(len(ids), dtype=bool)
+    
+    df_e, df_c = resultado['extrato'], resultado['controle']
+    conciliada = presente(df_e, 'descricao_extrato', ids_e) & (
+        presente(df_c, 'recurso_controle', ids_c) | presente(df_c, 'contraparte_controle', ids_c)
+    )
+    if grupos is not None:
+        conciliada |= pd.notna(grupos)
+    return conciliada
+
+def tabela_conciliacao(resultado):
+    """
+    Tabela completa do resultado (uma linha por par, por lançamento do extrato sem
+    par e por lançamento do controle sem par), com o status de cada linha
+    """
+    ids_e, ids_c, grupos = linhas_conciliacao(resultado)
+    df_result = montar_linhas(resultado, ids_e, ids_c)
+    df_result['status_conciliacao'] = np.where(
+        _conciliadas(resultado, ids_e, ids_c, grupos), "CONCILIADA", "NÃO CONCILIADO"
+    ).astype(object)
+    if grupos is not None:
+        df_result['grupo_conciliacao'] = grupos
+    df_result.attrs['agrupamento_interrompido'] = resultado['agrupamento_interrompido']
+    return df_result
+
+def linhas_por_status(resultado):
+    """
+    IDs das linhas de cada visão do relatório, sem montar a tabela completa:
+    - 'conciliadas': (IDs do extrato, IDs do controle, grupos), na ordem do resultado
+    - 'divergentes_extrato': IDs do extrato das linhas não conciliadas
+    - 'divergentes_controle': IDs do controle das linhas não conciliadas
+    """
+    ids_e, ids_c, grupos = linhas_conciliacao(resultado)
+    conciliada = _conciliadas(resultado, ids_e, ids_c, grupos)
+    divergente_e = ~conciliada & (ids_e >= 0)
+    divergente_c = ~conciliada & (ids_c >= 0)
+    return {
+        'conciliadas': (ids_e[conciliada], ids_c[conciliada], None if grupos is None else grupos[conciliada]),
+        'divergentes_extrato': ids_e[divergente_e],
+        'divergentes_controle': ids_c[divergente_c],
+    }
+
+def contagem_status(resultado):
+    """Quantidade de linhas do resultado por status"""
+    ids_e, ids_c, grupos = linhas_conciliacao(resultado)
+    conciliadas = int(_conciliadas(resultado, ids_e, ids_c, grupos).sum())
+    return {'CONCILIADA': conciliadas, 'NÃO CONCILIADO': len(ids_e) - conciliadas}
+
+def conciliacao_simples(df_extrato, df_controle, motor='hash', janela_dias=None,
+                        agrupar=False, max_itens=4, janela_grupo_dias=5, tempo_limite=5.0,
+                        retornar_pares=False):
+    """
+    Compara os valores e datas dos dois dataframes e retorna um dataframe conciliado
+    Garante que cada valor converja com apenas um outro valor
+    (tabela_conciliacao sobre parear_conciliacao; para o relatório e para
+    volumes grandes, prefira o resultado compacto de parear_conciliacao)
+    
+    Args:
+        df_extrato: DataFrame do extrato bancário
+        df_controle: DataFrame do controle financeiro
+        motor: Motor de pareamento ('hash' vetorizado, 'texto' com desempate
+            pela descrição ou 'laco' de referência)
+        janela_dias: Se informado, exige também que as datas estejam a no máximo
+            esse número de dias uma da outra (ignora o motor escolhido)
+        agrupar: Se True, faz uma segunda passada nas sobras procurando grupos
+            de até `max_itens` lançamentos que somem exatamente um lançamento
+            do outro lado, com datas dentro de `janela_grupo_dias`, limitada
+            a `tempo_limite` segundos
+        retornar_pares: Se True, retorna também os pares encontrados
+    
+    Returns:
+        DataFrame com as colunas de conciliação
+        (df.attrs['agrupamento_interrompido'] indica se o limite de tempo foi atingido)
+        Com retornar_pares=True, retorna (DataFrame, pares), em que pares traz as
+        posições das linhas pareadas (_id_extrato, _id_controle e, nos grupos,
+        grupo_conciliacao)
+    """
+    resultado = parear_conciliacao(
+        df_extrato, df_controle, motor, janela_dias, agrupar, max_itens, janela_grupo_dias, tempo_limite
+    )
+    df_result = tabela_conciliacao(resultado)
+    
+    if retornar_pares:
+        return df_result, resultado['pares']
+    return df_result
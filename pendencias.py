@@ -0,0 +1,217 @@
+"""
+Livro de pendências da conciliação (SQLite)
+
+Guarda, por conta, cada lançamento do extrato e do controle já carregado, identificado
+por um hash estável da transação, junto com os pares conciliados. Uma nova carga só
+insere os lançamentos ainda desconhecidos; a conciliação roda sobre os itens em aberto
+(os novos e as pendências de cargas e períodos anteriores), e o que continuar sem par
+fica em aberto para a próxima carga.
+
+A baixa dos pares no livro (registrar_conciliacao) é separada da conciliação: quem
+concilia só a grava depois que o relatório foi gerado e exportado, para que uma falha
+ou um cancelamento no meio do caminho não feche itens que nunca chegaram a um relatório.
+"""
+import hashlib
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+import funcoes_especificas as func
+
+# Colunas de cada lado que entram no hash e ficam guardadas no livro
+COLUNAS_LADO = {
+    'extrato': ['data', 'documento', 'descricao', 'valor_centavos'],
+    'controle': ['data', 'descricao', 'contraparte', 'plano de contas', 'valor_centavos'],
+}
+
+# Nome das colunas no banco (sem espaços)
+COLUNAS_BANCO = {
+    'data': 'data',
+    'documento': 'documento',
+    'descricao': 'descricao',
+    'contraparte': 'contraparte',
+    'plano de contas': 'plano_de_contas',
+    'valor_centavos': 'valor_centavos',
+}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS itens (
+    conta TEXT NOT NULL,
+    lado TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    data TEXT,
+    documento TEXT,
+    descricao TEXT,
+    contraparte TEXT,
+    plano_de_contas TEXT,
+    valor_centavos INTEGER,
+    status TEXT NOT NULL DEFAULT 'ABERTO',
+    carregado_em TEXT NOT NULL,
+    conciliado_em TEXT,
+    PRIMARY KEY (conta, lado, hash)
+);
+CREATE INDEX IF NOT EXISTS itens_abertos ON itens (conta, lado, status);
+CREATE TABLE IF NOT EXISTS pares (
+    conta TEXT NOT NULL,
+    hash_extrato TEXT NOT NULL,
+    hash_controle TEXT NOT NULL,
+    grupo INTEGER,
+    conciliado_em TEXT NOT NULL
+);
+"""
+
+
+def hash_transacoes(df, lado):
+    """
+    Hash estável de cada lançamento: lado + colunas do lado + ocorrência
+    A ocorrência (0, 1, 2...) diferencia lançamentos idênticos do mesmo arquivo,
+    como duas tarifas iguais no mesmo dia, sem depender da posição da linha
+
+    Returns:
+        pd.Series de hashes (texto), com o índice de df
+    """
+    partes = []
+    for coluna in COLUNAS_LADO[lado]:
+        serie = df[coluna]
+        if coluna == 'data':
+            serie = func.formatar_datas(serie)
+        partes.append(serie.astype(object).where(serie.notna(), '').astype(str))
+    chave = lado + '\x1f' + partes[0].str.cat(partes[1:], sep='\x1f')
+    chave = chave + '\x1f' + chave.groupby(chave).cumcount().astype(str)
+    return pd.Series(
+        [hashlib.sha256(texto.encode('utf-8')).hexdigest()[:32] for texto in chave],
+        index=df.index,
+        dtype=object,
+    )
+
+
+def abrir_livro(caminho):
+    """Abre (ou cria) o livro de pendências"""
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+
+def _registrar_novos(conexao, conta, lado, df, hashes, agora):
+    """Insere no livro apenas os lançamentos ainda desconhecidos; retorna quantos eram novos"""
+    colunas = COLUNAS_LADO[lado]
+    registros = pd.DataFrame({COLUNAS_BANCO[coluna]: df[coluna] for coluna in colunas})
+    registros['data'] = func.normalizar_datas(registros['data']).dt.strftime('%Y-%m-%d')
+    registros = registros.astype(object).where(registros.notna(), None)
+    registros['valor_centavos'] = [None if v is None else int(v) for v in registros['valor_centavos']]
+
+    nomes = ['conta', 'lado', 'hash', *registros.columns, 'carregado_em']
+    linhas = (
+        (conta, lado, h, *valores, agora)
+        for h, valores in zip(hashes, registros.itertuples(index=False, name=None))
+    )
+    antes = conexao.total_changes
+    conexao.executemany(
+        f"INSERT OR IGNORE INTO itens ({', '.join(nomes)}) VALUES ({', '.join('?' * len(nomes))})",
+        linhas,
+    )
+    return conexao.total_changes - antes
+
+
+def itens_abertos(conexao, conta, lado):
+    """
+    Lançamentos em aberto de um lado da conta, no formato usado pela conciliação
+    (data em datetime64, valor_centavos em Int64, textos repetitivos categóricos)
+    e com a coluna 'hash'
+    """
+    colunas = COLUNAS_LADO[lado]
+    consulta = (
+        f"SELECT hash, {', '.join(COLUNAS_BANCO[c] for c in colunas)} FROM itens "
+        "WHERE conta = ? AND lado = ? AND status = 'ABERTO' ORDER BY data, rowid"
+    )
+    df = pd.read_sql_query(consulta, conexao, params=(conta, lado))
+    df.columns = ['hash', *colunas]
+    df['data'] = pd.to_datetime(df['data'], format='%Y-%m-%d')
+    df['valor_centavos'] = df['valor_centavos'].astype('Int64')
+    return func.compactar_colunas(df)
+
+
+def conciliar_incremental(caminho, conta, df_extrato, df_controle, **opcoes):
+    """
+    Conciliação incremental de uma conta com o livro de pendências
+
+    1. Registra os lançamentos novos da carga (os já conhecidos são ignorados)
+    2. Concilia os itens em aberto do extrato com os do controle
+    3. Devolve os pares encontrados como baixa pendente: o livro só os marca como
+       conciliados em registrar_conciliacao; até lá, tudo continua em aberto
+
+    Args:
+        caminho: arquivo SQLite do livro
+        conta: identificador da conta (ex.: banco + número)
+        df_extrato, df_controle: DataFrames tratados da carga atual
+        **opcoes: repassadas para parear_conciliacao (motor, janela_dias, agrupar...)
+
+    Returns:
+        tuple: (resultado compacto de parear_conciliacao sobre os itens em aberto,
+        resumo da carga, baixa para registrar_conciliacao)
+    """
+    agora = datetime.now().isoformat(timespec='seconds')
+    conexao = abrir_livro(caminho)
+    try:
+        with conexao:
+            novos_extrato = _registrar_novos(conexao, conta, 'extrato', df_extrato, hash_transacoes(df_extrato, 'extrato'), agora)
+            novos_controle = _registrar_novos(conexao, conta, 'controle', df_controle, hash_transacoes(df_controle, 'controle'), agora)
+
+        abertos_extrato = itens_abertos(conexao, conta, 'extrato')
+        abertos_controle = itens_abertos(conexao, conta, 'controle')
+
+        resultado = func.parear_conciliacao(abertos_extrato, abertos_controle, **opcoes)
+        pares = resultado['pares']
+
+        # Posições pareadas -> hashes
+        hashes_extrato = abertos_extrato['hash'].to_numpy()[pares['_id_extrato'].to_numpy(dtype='int64')]
+        hashes_controle = abertos_controle['hash'].to_numpy()[pares['_id_controle'].to_numpy(dtype='int64')]
+        if 'grupo_conciliacao' in pares.columns:
+            grupos = [None if pd.isna(g) else int(g) for g in pares['grupo_conciliacao']]
+        else:
+            grupos = [None] * len(pares)
+    finally:
+        conexao.close()
+
+    baixa = {
+        'conta': conta,
+        'hashes_extrato': hashes_extrato.tolist(),
+        'hashes_controle': hashes_controle.tolist(),
+        'grupos': grupos,
+    }
+
+    resumo = {
+        'novos_extrato': novos_extrato,
+        'novos_controle': novos_controle,
+        'abertos_extrato': len(abertos_extrato),
+        'abertos_controle': len(abertos_controle),
+        'pares': len(pares),
+        'pendentes_extrato': len(abertos_extrato) - len(set(hashes_extrato)),
+        'pendentes_controle': len(abertos_controle) - len(set(hashes_controle)),
+    }
+    return resultado, resumo, baixa
+
+
+def registrar_conciliacao(caminho, baixa):
+    """
+    Grava no livro, numa única transação, os pares de uma conciliação incremental
+    (baixa de conciliar_incremental) e marca os itens como conciliados
+    Itens que já não estiverem em aberto não são alterados
+    """
+    agora = datetime.now().isoformat(timespec='seconds')
+    conta = baixa['conta']
+    conexao = abrir_livro(caminho)
+    try:
+        with conexao:
+            conexao.executemany(
+                "INSERT INTO pares (conta, hash_extrato, hash_controle, grupo, conciliado_em) VALUES (?, ?, ?, ?, ?)",
+                [(conta, e, c, g, agora) for e, c, g in zip(baixa['hashes_extrato'], baixa['hashes_controle'], baixa['grupos'])],
+            )
+            for lado, hashes in (('extrato', set(baixa['hashes_extrato'])), ('controle', set(baixa['hashes_controle']))):
+                conexao.executemany(
+                    "UPDATE itens SET status = 'CONCILIADO', conciliado_em = ? "
+                    "WHERE conta = ? AND lado = ? AND hash = ? AND status = 'ABERTO'",
+                    [(agora, conta, lado, h) for h in hashes],
+                )
+    finally:
+        conexao.close()
@@ -1,346 +1,487 @@
 import pandas as pd
 from datetime import datetime
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+import numpy as np
 import io
 import funcoes_especificas as func
-import streamlit as st
+
+# Aviso exibido quando a segunda passada (agrupamento) para no limite de tempo
+AVISO_AGRUPAMENTO_INTERROMPIDO = (
+    "Atenção: a busca de lançamentos agrupados foi interrompida pelo limite de tempo; "
+    "pode haver grupos não encontrados entre as transações não conciliadas."
+)
+
+def _tabela(df, colunas):
+    """
+    Seleciona e renomeia as colunas do resultado da conciliação para uma tabela
+    do relatório, mantendo os tipos (datas em datetime64, valores em centavos)
+    """
+    return df[list(colunas)].rename(columns=colunas).reset_index(drop=True)
 
 def criar_relatorio_conciliação(
-    df_conciliado,
+    resultado,
     saldo_inicial,  
     mov_extrato, 
     mov_controle,
     total_extrato,
     total_controle,
-    nome_usuario
+    saldo_final_extrato,
+    saldo_final_controle,
+    nome_usuario,
+    carga_livro=None
 ):
     """
-    Cria um relatório completo da conciliação em um DataFrame estruturado
-    que será exportado para excel
-    """
+    Cria o relatório da conciliação em seções tipadas, que o exportador
+    consome diretamente:
+    - cabeçalho: usuário, data de realização e se o agrupamento foi interrompido
+    - resumo: DataFrame com os indicadores do extrato e do controle
+    - conciliadas / divergentes do extrato / divergentes do controle:
+      quantidade, total e a tabela como DataFrame
+    Os valores ficam em centavos inteiros e as datas em datetime64; a conversão
+    para reais e para DD/MM/YYYY só acontece na exportação
     
-    relatorio_dados = []
+    Args:
+        resultado: resultado compacto de func.parear_conciliacao; cada tabela
+            é montada só com as linhas que entram nela
+        carga_livro: resumo da carga de pendencias.conciliar_incremental; se
+            informado, entra no resumo (lançamentos novos, em aberto e pendentes)
     
-    # CABEÇALHO DO RELATÓRIO
+    Returns:
+        dict com as seções 'cabecalho', 'resumo', 'conciliadas',
+        'divergentes_extrato' e 'divergentes_controle'
+    """
     
-    relatorio_dados.append(["RELATÓRIO FINAL DE CONCILIAÇÃO BANCÁRIA"])
-    relatorio_dados.append([])  # Linha em branco
-    relatorio_dados.append(["Usuário Responsável:", nome_usuario])
-    relatorio_dados.append(["Data da Realização:", datetime.now().strftime("%d/%m/%Y %H:%M")])
-    relatorio_dados.append([])  # Linha em branco
+    # CABEÇALHO DO RELATÓRIO
+    cabecalho = {
+        'usuario': nome_usuario,
+        'data_realizacao': datetime.now(),
+        'agrupamento_interrompido': bool(resultado['agrupamento_interrompido']),
+    }
     
     # DADOS GERAIS DA CONCILIAÇÃO
-    relatorio_dados.append(["DADOS GERAIS DA CONCILIAÇÃO"])
-    relatorio_dados.append(["", "EXTRATO", "CONTROLE FINANCEIRO"])
-    relatorio_dados.append(["Total de Movimentações:", mov_extrato, mov_controle])
-    relatorio_dados.append(["Saldo Inicial (R$):", saldo_inicial, saldo_inicial])
-    relatorio_dados.append(["Valor Total Movimentado (R$):", total_extrato, total_controle])
-    relatorio_dados.append(["Saldo Final (R$):", st.session_state.saldo_final_ex, st.session_state.saldo_final_cf])
-    relatorio_dados.append([])  # Linha em branco
-    relatorio_dados.append([])  # Linha em branco
-    
-    # ESTATÍSTICAS DA CONCILIAÇÃO
-    #conciliadas = len(df_conciliado[df_conciliado['status_conciliacao'] == 'CONCILIADA'])
-    #nao_conciliadas = len(df_conciliado[df_conciliado['status_conciliacao'] == 'NÃO CONCILIADO'])
-    
-    #relatorio_dados.append(["ESTATÍSTICAS DA CONCILIAÇÃO"])
-    #relatorio_dados.append(["Transações Conciliadas:", conciliadas])
-    #relatorio_dados.append(["Transações Não Conciliadas:", nao_conciliadas])
-    #relatorio_dados.append(["Taxa de Conciliação:", f"{(conciliadas/(conciliadas+nao_conciliadas)*100):.1f}%" if (conciliadas+nao_conciliadas) > 0 else "0%"])
-    #relatorio_dados.append([])  # Linha em branco
-    #relatorio_dados.append([])  # Linha em branco
+    resumo = pd.DataFrame({
+        'rotulo': ["Total de Movimentações:", "Saldo Inicial (R$):", "Valor Total Movimentado (R$):", "Saldo Final (R$):"],
+        'extrato': [mov_extrato, saldo_inicial, total_extrato, saldo_final_extrato],
+        'controle': [mov_controle, saldo_inicial, total_controle, saldo_final_controle],
+        'moeda': [False, True, True, True],
+    })
+    
+    # Conciliação incremental: os totais acima são dos itens em aberto no livro
+    if carga_livro is not None:
+        resumo = pd.concat([resumo, pd.DataFrame({
+            'rotulo': ["Lançamentos Novos nesta Carga:", "Itens em Aberto na Conciliação:", "Pendentes Após a Conciliação:"],
+            'extrato': [carga_livro['novos_extrato'], carga_livro['abertos_extrato'], carga_livro['pendentes_extrato']],
+            'controle': [carga_livro['novos_controle'], carga_livro['abertos_controle'], carga_livro['pendentes_controle']],
+            'moeda': [False, False, False],
+        })], ignore_index=True)
+    
+    linhas = func.linhas_por_status(resultado)
+    
+    # Operações não conciliadas presentes no extrato, ordenadas pela data
+    # (e pelo valor no empate); datas vazias no final
+    divergentes_extrato = resultado['extrato'].take(linhas['divergentes_extrato'])
+    divergentes_extrato = divergentes_extrato[divergentes_extrato['valor_extrato'].notna()].sort_values(
+        ['data_extrato', 'valor_extrato'], na_position='last', kind='stable'
+    )
+    tabela_extrato = _tabela(divergentes_extrato, {
+        'data_extrato': "Data",
+        'documento_extrato': "Documento",
+        'descricao_extrato': "Descrição",
+        'valor_extrato': "Valor (R$)",
+    })
+    tabela_extrato["Crítica"] = ''
+    
+    # Operações não conciliadas presentes no controle financeiro
+    divergentes_controle = resultado['controle'].take(linhas['divergentes_controle'])
+    divergentes_controle = divergentes_controle[divergentes_controle['valor_controle'].notna()].sort_values(
+        ['data_controle', 'valor_controle'], na_position='last', kind='stable'
+    )
+    tabela_controle = _tabela(divergentes_controle, {
+        'data_controle': "Data",
+        'recurso_controle': "Descrição",
+        'contraparte_controle': "Contraparte",
+        'plano de contas_controle': "Plano de Contas",
+        'valor_controle': "Valor (R$)",
+    })
+    tabela_controle["Crítica"] = ''
+    
+    # Operações conciliadas, na ordem do resultado
+    colunas_conciliadas = {
+        'data_extrato': "Data Extrato",
+        'documento_extrato': "Documento Extrato",
+        'descricao_extrato': "Descrição Extrato",
+        'valor_extrato': "Valor Extrato (R$)",
+        'data_controle': "Data Controle",
+        'recurso_controle': "Descrição Controle",
+        'contraparte_controle': "Contraparte Controle",
+        'plano de contas_controle': "Plano de Contas Controle",
+        'valor_controle': "Valor Controle (R$)",
+    }
+    operacoes_convergentes = func.montar_linhas(resultado, *linhas['conciliadas'])
+    # Conciliação agrupada: identifica as linhas de cada grupo
+    if 'grupo_conciliacao' in operacoes_convergentes.columns and operacoes_convergentes['grupo_conciliacao'].notna().any():
+        colunas_conciliadas['grupo_conciliacao'] = "Grupo"
+    tabela_conciliadas = _tabela(operacoes_convergentes, colunas_conciliadas)
+    
+    # Totais por redução vetorizada (em centavos)
+    return {
+        'cabecalho': cabecalho,
+        'resumo': resumo,
+        'conciliadas': {
+            'quantidade': len(tabela_conciliadas),
+            'total': int(tabela_conciliadas["Valor Extrato (R$)"].sum()),
+            'tabela': tabela_conciliadas,
+        },
+        'divergentes_extrato': {
+            'quantidade': len(tabela_extrato),
+            'total': int(tabela_extrato["Valor (R$)"].sum()),
+            'tabela': tabela_extrato,
+        },
+        'divergentes_controle': {
+            'quantidade': len(tabela_controle),
+            'total': int(tabela_controle["Valor (R$)"].sum()),
+            'tabela': tabela_controle,
+        },
+    }
+
 
-    operacoes_divergentes = df_conciliado[df_conciliado['status_conciliacao'] == 'NÃO CONCILIADO']
-    operacoes_convergentes = df_conciliado[df_conciliado['status_conciliacao'] == 'CONCILIADA']
+# Títulos e cores de cada aba do relatório
+ABA_CONCILIADAS = 'Transações Conciliadas'
+ABA_DIVERGENTES = 'Transações Não Conciliadas'
+CORES_ABAS = {
+    ABA_CONCILIADAS: '5fb7fa',
+    ABA_DIVERGENTES: 'fc7474',
+}
+LARGURA_MAXIMA_COLUNA = 50
+
+
+def _estilos_relatorio():
+    """
+    Estilos nomeados do relatório, registrados uma vez no workbook e
+    aplicados na escrita conforme o tipo de cada seção
+    """
+    from openpyxl.styles import Color, Font, Alignment, PatternFill, Border, Side, NamedStyle
     
-    relatorio_div = relatorio_dados.copy()
-    relatorio_conv = relatorio_dados.copy()
+    # 1. Fontes
+    fonte_titulo = Font(name='Calibri', size=14, bold=True, color='000000')
+    fonte_cabecalho = Font(name='Calibri', size=11, bold=True, color='000000')
+    fonte_normal = Font(name='Calibri', size=10)
+    fonte_negativo = Font(name='Calibri', size=10, color='FF0000')
+    fonte_positivo = Font(name='Calibri', size=10, color='0000FF')
+    fonte_padrao = Font(name='Calibri', size=11, family=2, scheme='minor', color=Color(theme=1))
     
-    # Relatório das Operações Não Conciliadas
-    if len(operacoes_divergentes) > 0:
-        relatorio_div.append(["OPERAÇÕES DIVERGENTES (NÃO CONCILIADAS)"])
-        relatorio_div.append([])  # Linha em branco
-        
-        # Cabeçalho das operações divergentes
-        cabecalho_extrato = [
-            "Data", "Documento", "Descrição", "Valor (R$)", "Crítica"
+    # 2. Borda
+    borda_fina = Side(border_style='thin', color='D0D0D0')
+    borda = Border(left=borda_fina, right=borda_fina, top=borda_fina, bottom=borda_fina)
+    
+    # 3. Alinhamento
+    alinhamento_centro = Alignment(horizontal='center', vertical='center')
+    alinhamento_esquerda = Alignment(horizontal='left', vertical='center')
+    alinhamento_direita = Alignment(horizontal='right', vertical='center')
+    
+    # 4. Formato do Número
+    formato_numero = "#,##0.00"
+    
+    estilos = [
+        NamedStyle(name='texto', font=fonte_normal, border=borda, alignment=alinhamento_esquerda),
+        NamedStyle(name='numero', font=fonte_padrao, border=borda, alignment=alinhamento_direita),
+        NamedStyle(name='moeda_positivo', font=fonte_positivo, border=borda, alignment=alinhamento_direita, number_format=formato_numero),
+        NamedStyle(name='moeda_negativo', font=fonte_negativo, border=borda, alignment=alinhamento_direita, number_format=formato_numero),
+        NamedStyle(name='moeda_zero', font=fonte_normal, border=borda, alignment=alinhamento_direita, number_format=formato_numero),
+    ]
+    
+    # Títulos e cabeçalhos de tabela, com a cor de cada aba
+    for aba, cor in CORES_ABAS.items():
+        preenchimento = PatternFill(start_color=cor, end_color=cor, fill_type='solid')
+        estilos.append(NamedStyle(name=f'titulo {aba}', font=fonte_titulo, fill=preenchimento, border=borda, alignment=alinhamento_centro))
+        estilos.append(NamedStyle(name=f'cabecalho {aba}', font=fonte_cabecalho, fill=preenchimento, border=borda, alignment=alinhamento_centro))
+    
+    return estilos
+
+
+def _estilo_valor(valor, moeda=False):
+    """Estilo de uma célula avulsa conforme o tipo do valor"""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        if not moeda:
+            return 'numero'
+        return 'moeda_negativo' if valor < 0 else 'moeda_positivo' if valor > 0 else 'moeda_zero'
+    return 'texto'
+
+
+def _tabela_para_saida(tabela):
+    """
+    Prepara uma tabela do relatório para a escrita, por colunas:
+    datas em DD/MM/YYYY, valores em reais e vazios como None,
+    junto com o estilo de cada célula
+    
+    Returns:
+        tuple: (lista de colunas de valores, lista de colunas de estilos)
+    """
+    valores, estilos = [], []
+    for coluna in tabela.columns:
+        serie = tabela[coluna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            serie = func.formatar_datas(serie)
+            estilo = np.full(len(serie), 'texto', dtype=object)
+        elif coluna.endswith("(R$)"):
+            centavos = serie.astype('Float64')
+            serie = func.centavos_para_reais(serie)
+            estilo = np.select(
+                [centavos.lt(0).fillna(False).to_numpy(dtype=bool), centavos.gt(0).fillna(False).to_numpy(dtype=bool), centavos.eq(0).fillna(False).to_numpy(dtype=bool)],
+                ['moeda_negativo', 'moeda_positivo', 'moeda_zero'],
+                'texto'
+            ).astype(object)
+        else:
+            estilo = None
+        serie = serie.astype(object)
+        serie = serie.where(serie.notna(), None)
+        if estilo is None:
+            estilo = [_estilo_valor(v) for v in serie]
+        valores.append(serie.tolist())
+        estilos.append(list(estilo))
+    return valores, estilos
+
+
+def _blocos_abas(relatorio):
+    """
+    Organiza as seções do relatório nos blocos de cada aba, na ordem de escrita
+    Cada bloco é uma linha avulsa [(valor, estilo), ...] ou uma tabela
+    
+    Returns:
+        dict: aba -> lista de blocos ('linha', células) ou ('tabela', tabela)
+    """
+    reais = func.centavos_para_reais
+    
+    def linha(*valores, moeda=False):
+        return ('linha', [(v, _estilo_valor(v, moeda)) for v in valores])
+    
+    def titulo(texto, aba):
+        return ('linha', [(texto, f'titulo {aba}')])
+    
+    def cabecalho(colunas, aba):
+        return ('linha', [(c, f'cabecalho {aba}') for c in colunas])
+    
+    vazio = ('linha', [])
+    
+    abas = {}
+    for aba in (ABA_CONCILIADAS, ABA_DIVERGENTES):
+        # CABEÇALHO E DADOS GERAIS (iguais nas duas abas)
+        blocos = [
+            titulo("RELATÓRIO FINAL DE CONCILIAÇÃO BANCÁRIA", aba),
+            vazio,
+            linha("Usuário Responsável:", relatorio['cabecalho']['usuario']),
+            linha("Data da Realização:", relatorio['cabecalho']['data_realizacao'].strftime("%d/%m/%Y %H:%M")),
+            *([linha(AVISO_AGRUPAMENTO_INTERROMPIDO)] if relatorio['cabecalho']['agrupamento_interrompido'] else []),
+            vazio,
+            titulo("DADOS GERAIS DA CONCILIAÇÃO", aba),
+            ('linha', [(None, 'texto'), ("EXTRATO", f'cabecalho {aba}'), ("CONTROLE FINANCEIRO", f'cabecalho {aba}')]),
         ]
-        
-        cabecalho_controle = [
-            "Data", "Descrição", "Contraparte", "Plano de Contas", "Valor (R$)", "Crítica"
+        for rotulo, extrato, controle, moeda in relatorio['resumo'].itertuples(index=False):
+            if moeda:
+                blocos.append(linha(rotulo, reais(extrato), reais(controle), moeda=True))
+            else:
+                blocos.append(linha(rotulo, int(extrato), int(controle)))
+        blocos += [vazio, vazio]
+        abas[aba] = blocos
+    
+    # Relatório das Operações Conciliadas
+    blocos = abas[ABA_CONCILIADAS]
+    conciliadas = relatorio['conciliadas']
+    if conciliadas['quantidade'] > 0:
+        blocos += [
+            titulo("OPERAÇÕES CONVERGENTES (CONCILIADAS)", ABA_CONCILIADAS),
+            linha("Total de Transações Conciliadas:", conciliadas['quantidade']),
+            linha("Valor Total Conciliado (R$):", reais(conciliadas['total']), moeda=True),
+            vazio,
+            cabecalho(conciliadas['tabela'].columns, ABA_CONCILIADAS),
+            ('tabela', conciliadas['tabela']),
         ]
-        
-        # Adiciona dados que tem no extrato e não estão no controle financeiro
-        relatorio_div.append(["Transações Não Conciliadas Presentes no Extrato:"])
-        extrato_divergente = []
-        for _, row in operacoes_divergentes.iterrows():
-            # Verifica se tem dados de data (pode não ter se for merge outer)
-            data_extrato = row.get('data_extrato', '') if 'data_extrato' in row else ''
-            data_controle = row.get('data_controle', '') if 'data_controle' in row else ''
-            
-            linha = {
-                'data': data_extrato,
-                'documento': row.get('documento_extrato', ''),
-                'descricao': row.get('descricao_extrato', ''),
-                'valor': float(row.get('valor_extrato', 0)) if pd.notna(row.get('valor_extrato')) else "vazio"
-            }
-            if linha['valor'] != "vazio":
-                extrato_divergente.append(linha)
-        
-        extrato_divergente = func.ordenar_por_data_br(extrato_divergente)
-        sum_divergente_extrato = len(extrato_divergente)
-        total_divergente_extrato = 0
-        for i in extrato_divergente:
-            total_divergente_extrato += i['valor']
-        
-        relatorio_div.append(["Total de Transações Não Conciliadas:", sum_divergente_extrato])
-        relatorio_div.append(["Valor Total das Transações Não Conciliadas (R$):", total_divergente_extrato])
-        relatorio_div.append([])  # Linha em branco
-        relatorio_div.append(cabecalho_extrato)
-        
-        for i in extrato_divergente:
-            relatorio_div.append([i['data'], i['documento'], i['descricao'], i['valor'], ''])
-            
-        relatorio_div.append([])
-            
-        # Adiciona dados que tem no controle financeiro e não estão no extrato
-        relatorio_div.append(["Transações Não Conciliadas Presentes no Controle Financeiro:"])
-        
-        controle_divergente = []
-        for _, row in operacoes_divergentes.iterrows():
-            # Verifica se tem dados de data (pode não ter se for merge outer)
-            data_extrato = row.get('data_extrato', '') if 'data_extrato' in row else ''
-            data_controle = row.get('data_controle', '') if 'data_controle' in row else ''
-            
-            linha = {
-                'data': data_controle,
-                'recurso': row.get('recurso_controle', ''),
-                'contraparte': row.get('contraparte_controle', ''),
-                'plano de contas': row.get('plano de contas_controle'),
-                'valor': float(row.get('valor_controle', 0)) if pd.notna(row.get('valor_controle')) else "vazio"
-            }
-            if linha['valor'] != "vazio":
-                controle_divergente.append(linha)
-            
-        controle_divergente = func.ordenar_por_data_br(controle_divergente)
-        sum_divergente_controle = len(controle_divergente)
-        total_divergente_controle = 0
-        for i in controle_divergente:
-            total_divergente_controle += i['valor']
-    
-        relatorio_div.append(["Total de Transações Não Conciliadas:", sum_divergente_controle])
-        relatorio_div.append(["Valor Total das Transações Não Conciliadas (R$):", total_divergente_controle])
-        relatorio_div.append([])  # Linha em branco
-        relatorio_div.append(cabecalho_controle)
-        
-        for i in controle_divergente:
-                relatorio_div.append([i['data'], i['recurso'], i['contraparte'], i['plano de contas'], i['valor'], ''])
-            
     else:
-        relatorio_div.append(["NENHUMA OPERAÇÃO DIVERGENTE ENCONTRADA"])
-        
-    # Relatório das Operações Conciliadas
-    if len(operacoes_convergentes) > 0:
-        sum_convergentes = len(operacoes_convergentes)
-        total_convergentes = sum(operacoes_convergentes['valor_extrato'])
-        
-        relatorio_conv.append(["OPERAÇÕES CONVERGENTES (CONCILIADAS)"])
-        relatorio_conv.append(["Total de Transações Conciliadas:", sum_convergentes])
-        relatorio_conv.append(["Valor Total Conciliado (R$):", total_convergentes])
-        relatorio_conv.append([])  # Linha em branco
-        
-        # Cabeçalho das operações convergentes
-        cabecalho = [
-            "Data Extrato", "Documento Extrato", "Descrição Extrato", "Valor Extrato (R$)", 
-            "Data Controle", "Descrição Controle", "Contraparte Controle", "Plano de Contas Controle", "Valor Controle (R$)"
+        blocos.append(linha("NENHUMA OPERAÇÃO CONCILIADA ENCONTRADA"))
+    
+    # Relatório das Operações Não Conciliadas
+    blocos = abas[ABA_DIVERGENTES]
+    div_extrato = relatorio['divergentes_extrato']
+    div_controle = relatorio['divergentes_controle']
+    if div_extrato['quantidade'] > 0 or div_controle['quantidade'] > 0:
+        blocos += [titulo("OPERAÇÕES DIVERGENTES (NÃO CONCILIADAS)", ABA_DIVERGENTES), vazio]
+        secoes = [
+            ("Transações Não Conciliadas Presentes no Extrato:", div_extrato),
+            ("Transações Não Conciliadas Presentes no Controle Financeiro:", div_controle),
         ]
-        relatorio_conv.append(cabecalho)
-        
-        # Adiciona cada operação convergente
-        for _, row in operacoes_convergentes.iterrows():
-            # Verifica se tem dados de data (pode não ter se for merge outer)
-            data_extrato = row.get('data_extrato', '') if 'data_extrato' in row else ''
-            data_controle = row.get('data_controle', '') if 'data_controle' in row else ''
-            
-            linha = [
-                data_extrato,
-                row.get('documento_extrato', ''),
-                row.get('descricao_extrato', ''),
-                float(row.get('valor_extrato', 0)) if pd.notna(row.get('valor_extrato')) else "",
-                data_controle,
-                row.get('recurso_controle', ''),
-                row.get('contraparte_controle', ''),
-                row.get('plano de contas_controle'),
-                float(row.get('valor_controle', 0)) if pd.notna(row.get('valor_controle')) else "",
+        for i, (texto, secao) in enumerate(secoes):
+            if i > 0:
+                blocos.append(vazio)
+            blocos += [
+                titulo(texto, ABA_DIVERGENTES),
+                linha("Total de Transações Não Conciliadas:", secao['quantidade']),
+                linha("Valor Total das Transações Não Conciliadas (R$):", reais(secao['total']), moeda=True),
+                vazio,
+                cabecalho(secao['tabela'].columns, ABA_DIVERGENTES),
+                ('tabela', secao['tabela']),
             ]
-            relatorio_conv.append(linha)
     else:
-        relatorio_conv.append(["NENHUMA OPERAÇÃO CONCILIADA ENCONTRADA"])
+        blocos.append(linha("NENHUMA OPERAÇÃO DIVERGENTE ENCONTRADA"))
     
-    # Converte para DataFrame
-    df_relatorio_div = pd.DataFrame(relatorio_div)
-    df_relatorio_conv = pd.DataFrame(relatorio_conv)
-    
-    return df_relatorio_conv, df_relatorio_div
+    return abas
 
 
-def exportar_relatorio_excel(df_relatorio_conv, df_relatorio_div):
+def exportar_relatorio_excel(relatorio):
+    """
+    Exporta as seções do relatório (criar_relatorio_conciliação) para Excel em memória
+    Escreve cada linha uma única vez, em modo write-only (streaming), com estilos
+    nomeados aplicados na própria escrita; as larguras das colunas são calculadas
+    a partir dos dados antes de a aba começar a ser gravada
+    O openpyxl só é importado aqui, na exportação
     """
-    Exporta o DataFrame do relatório para Excel em memória
-    """    
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
     
     # Cria um buffer em memória
     output = io.BytesIO()
     
-    # Cria o Excel writer
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        
-        # Aba com os Convergentes
-        df_relatorio_conv.to_excel(
-            writer,
-            index=False,
-            header=False,  
-            sheet_name='Transações Conciliadas'
-        )
-                
-        # Aba com os Divergentes
-        df_relatorio_div.to_excel(
-            writer,
-            index=False,
-            header=False,  
-            sheet_name='Transações Não Conciliadas'
-        )
-        
-        # CRIAÇÃO DO ESTILO PERSONALIZADO
-        workbook = writer.book
-        
-        # 1. Fontes
-        fonte_titulo = Font(name='Calibri', size=14, bold=True, color='000000')
-        fonte_cabecalho = Font(name='Calibri', size=11, bold=True, color='000000')
-        fonte_normal = Font(name='Calibri', size=10)
-        fonte_negativo = Font(name='Calibri', size=10, color='FF0000')
-        fonte_positivo = Font(name='Calibri', size=10, color='0000FF')
-        
-        # 2. Cores
-        cor_titulo_conciliado = PatternFill(start_color='5fb7fa', end_color='5fb7fa', fill_type='solid')
-        cor_cabecalho_conciliado = PatternFill(start_color='5fb7fa', end_color='5fb7fa', fill_type='solid')
-        cor_titulo_divergente = PatternFill(start_color='fc7474', end_color='fc7474', fill_type='solid')
-        cor_cabecalho_divergente = PatternFill(start_color='fc7474', end_color='fc7474', fill_type='solid')
+    workbook = Workbook(write_only=True)
+    for estilo in _estilos_relatorio():
+        workbook.add_named_style(estilo)
+    
+    for aba, blocos in _blocos_abas(relatorio).items():
+        worksheet = workbook.create_sheet(aba)
         
-        # 3. Borda
-        borda_fina = Side(border_style='thin', color='D0D0D0')
-        borda = Border(left=borda_fina, right=borda_fina, top=borda_fina, bottom=borda_fina)
-
-        # 4. Alinhamento
-        alinhamento_centro = Alignment(horizontal='center', vertical='center')
-        alinhamento_esquerda = Alignment(horizontal='left', vertical='center')
-        alinhamento_direita = Alignment(horizontal='right', vertical='center')
+        # Prepara as tabelas por colunas e descobre a largura da aba
+        preparados = []
+        n_colunas = 1
+        for tipo, conteudo in blocos:
+            if tipo == 'tabela':
+                conteudo = (len(conteudo), *_tabela_para_saida(conteudo))
+                n_colunas = max(n_colunas, len(conteudo[1]))
+            else:
+                n_colunas = max(n_colunas, len(conteudo))
+            preparados.append((tipo, conteudo))
         
-        # 5. Formato do Número
-        formato_numero = "#,##0.00"
+        # Largura das colunas pelo maior texto (células vazias contam como 'None')
+        larguras = [len('None')] * n_colunas
+        for tipo, conteudo in preparados:
+            if tipo == 'tabela':
+                quantidade, valores, _ = conteudo
+                for i, coluna in enumerate(valores):
+                    if coluna:
+                        larguras[i] = max(larguras[i], int(pd.Series(coluna, dtype=object).map(str).str.len().max()))
+            else:
+                for i, (valor, _) in enumerate(conteudo):
+                    larguras[i] = max(larguras[i], len(str(valor)))
+        for i, largura in enumerate(larguras):
+            worksheet.column_dimensions[get_column_letter(i + 1)].width = min(largura + 2, LARGURA_MAXIMA_COLUNA)
         
-        # Aplica estilos em ambas as abas
-        for sheet_name in ['Transações Conciliadas', 'Transações Não Conciliadas']:
-            worksheet = workbook[sheet_name]
-
-            # Aplicação da Formatação
-            for row in worksheet.iter_rows():
-                for cell in row:
-                    # Aplica borda para todas as células
-                    cell.border = borda
-                    
-                    # Para células NÃO numéricas
-                    if not isinstance(cell.value, (int, float)):
-                        # Aplica fonte normal e alinhamento
-                        cell.font = fonte_normal
-                        cell.alignment = alinhamento_esquerda                            
-                    else :
-                        # Para células numéricas
-                        cell.alignment = alinhamento_direita
-                        
-                        # Formatando o cabeçalho
-                        cabecalho_numerico = [9, 10, 11, 16, 18]
-                        if cell.row in cabecalho_numerico and cell.column_letter in ["B", "C"]:
-                            cell.number_format = formato_numero
-                            if cell.value < 0:
-                                cell.font = fonte_negativo  # Vermelho para negativos
-                            elif cell.value > 0:
-                                cell.font = fonte_positivo  # Azul para positivos
-                            else:
-                                cell.font = fonte_normal  # Zero mantém fonte normal
-                        
-                        
-                        # Formatando as demais colunas
-                        if cell.row >= 19 and cell.column_letter in ["B", "C", "D", "E", "I"]:
-                            cell.number_format = formato_numero
-                            
-                            if cell.value < 0:
-                                cell.font = fonte_negativo  # Vermelho para negativos
-                            elif cell.value > 0:
-                                cell.font = fonte_positivo  # Azul para positivos
-                            else:
-                                cell.font = fonte_normal  # Zero mantém fonte normal
-                    
-                    # Estilo para títulos (linhas com texto em negrito)
-                    if sheet_name == "Transações Conciliadas":
-                        if cell.value and isinstance(cell.value, str):
-                            
-                            if any(titulo in cell.value for titulo in [
-                                "RELATÓRIO FINAL DE CONCILIAÇÃO BANCÁRIA",
-                                "DADOS GERAIS DA CONCILIAÇÃO", 
-                                "RESUMO DE MOVIMENTAÇÕES",
-                                "OPERAÇÕES CONVERGENTES",
-                            ]):
-                                cell.font = fonte_titulo
-                                cell.fill = cor_titulo_conciliado
-                                cell.alignment = alinhamento_centro
-                            
-                            # Estilo para cabeçalhos de tabela
-                            elif cell.value in ["EXTRATO","CONTROLE FINANCEIRO","Data Extrato", "Descrição Extrato", "Documento Extrato", "Valor Extrato (R$)", 
-                                            "Data Controle", "Descrição Controle", "Contraparte Controle", "Plano de Contas Controle", "Valor Controle (R$)", "Crítica"]:
-                                cell.font = fonte_cabecalho
-                                cell.fill = cor_cabecalho_conciliado
-                                cell.alignment = alinhamento_centro
-                                
-                    elif sheet_name == "Transações Não Conciliadas":
-                        if cell.value and isinstance(cell.value, str):
-                            
-                            if any(titulo in cell.value for titulo in [
-                                "RELATÓRIO FINAL DE CONCILIAÇÃO BANCÁRIA",
-                                "DADOS GERAIS DA CONCILIAÇÃO", 
-                                "RESUMO DE MOVIMENTAÇÕES",
-                                "OPERAÇÕES DIVERGENTES",
-                                "Transações Não Conciliadas Presentes no Extrato:",
-                                "Transações Não Conciliadas Presentes no Controle Financeiro:"
-                            ]):
-                                cell.font = fonte_titulo
-                                cell.fill = cor_titulo_divergente
-                                cell.alignment = alinhamento_centro
-                            
-                            # Estilo para cabeçalhos de tabela
-                            elif cell.value in ["EXTRATO", "CONTROLE FINANCEIRO", "Data", "Documento", "Descrição", "Contraparte", "Plano de Contas", "Valor (R$)", "Crítica"]:
-                                cell.font = fonte_cabecalho
-                                cell.fill = cor_cabecalho_divergente
-                                cell.alignment = alinhamento_centro
-            
+        def celula(valor, estilo):
+            cell = WriteOnlyCell(worksheet, value=valor)
+            cell.style = estilo
+            return cell
         
-        # Ajusta a largura das colunas
-        for sheet_name in writer.sheets:
-            worksheet = writer.sheets[sheet_name]
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+        # Escrita única de cada linha, completando a largura da aba com células vazias
+        for tipo, conteudo in preparados:
+            if tipo == 'tabela':
+                quantidade, valores, estilos = conteudo
+                complemento = [(None, 'texto')] * (n_colunas - len(valores))
+                for linha_valores, linha_estilos in zip(zip(*valores), zip(*estilos)):
+                    worksheet.append(
+                        [celula(v, e) for v, e in zip(linha_valores, linha_estilos)]
+                        + [celula(v, e) for v, e in complemento]
+                    )
+            else:
+                celulas = conteudo + [(None, 'texto')] * (n_colunas - len(conteudo))
+                worksheet.append([celula(v, e) for v, e in celulas])
+    
+    workbook.save(output)
     
     # Pega os bytes
     excel_bytes = output.getvalue()
     output.close()
     
     return excel_bytes
+
+
+# Seções do relatório com as tabelas de dados exportadas em Parquet/CSV
+SECOES_DADOS = ['conciliadas', 'divergentes_extrato', 'divergentes_controle']
+
+
+def _bloco_dados(bloco):
+    """
+    Prepara um bloco de uma tabela do relatório para os formatos de dados:
+    valores de centavos para reais, textos em 'string' (colunas object vazias
+    virariam o tipo nulo no esquema Parquet) e sem a coluna 'Crítica' (só usada no Excel)
+    """
+    bloco = bloco.drop(columns=["Crítica"], errors='ignore')
+    for coluna in bloco.columns:
+        if coluna.endswith("(R$)"):
+            bloco[coluna] = func.centavos_para_reais(bloco[coluna])
+        elif bloco[coluna].dtype == object:
+            bloco[coluna] = bloco[coluna].astype('string')
+    return bloco
+
+
+def _abrir_destino(destino):
+    """Buffer em memória (destino=None) ou o próprio destino (caminho ou arquivo)"""
+    return io.BytesIO() if destino is None else destino
+
+
+def exportar_relatorio_parquet(relatorio, destino=None, tamanho_bloco=func.TAMANHO_BLOCO):
+    """
+    Exporta as tabelas de dados do relatório (conciliadas e divergentes) como
+    Parquet, sem nenhuma formatação: um arquivo .parquet por seção dentro de um zip
+    Cada tabela é gravada em blocos de tamanho_bloco linhas (um row group por bloco),
+    direto no zip; datas ficam como datas e valores em reais
+    O pyarrow só é importado aqui, na exportação
+    
+    Args:
+        destino: caminho ou arquivo binário do zip; se None, devolve os bytes
+    """
+    import zipfile
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    saida = _abrir_destino(destino)
+    # Parquet já é comprimido: o zip só agrupa os arquivos
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED) as arquivo_zip:
+        for secao in SECOES_DADOS:
+            tabela = relatorio[secao]['tabela']
+            esquema = pa.Schema.from_pandas(_bloco_dados(tabela.head(0)), preserve_index=False)
+            with arquivo_zip.open(f"{secao}.parquet", 'w', force_zip64=True) as f:
+                with pq.ParquetWriter(f, esquema) as escritor:
+                    for bloco in func.dividir_em_blocos(tabela, tamanho_bloco):
+                        escritor.write_table(pa.Table.from_pandas(_bloco_dados(bloco), schema=esquema, preserve_index=False))
+    
+    if destino is None:
+        return saida.getvalue()
+
+
+def exportar_relatorio_csv(relatorio, destino=None, decimal_br=False, tamanho_bloco=func.TAMANHO_BLOCO):
+    """
+    Exporta as tabelas de dados do relatório (conciliadas e divergentes) como
+    CSV, sem nenhuma formatação: um arquivo .csv por seção dentro de um zip
+    Cada tabela é escrita em blocos de tamanho_bloco linhas, direto no zip
+    
+    Args:
+        destino: caminho ou arquivo binário do zip; se None, devolve os bytes
+        decimal_br: padrão brasileiro (separador ';', decimal ',', datas DD/MM/YYYY
+            e BOM para o Excel reconhecer o UTF-8); senão ',', '.' e YYYY-MM-DD
+    """
+    import zipfile
+    
+    if decimal_br:
+        opcoes = {'sep': ';', 'decimal': ',', 'date_format': '%d/%m/%Y'}
+        codificacao = 'utf-8-sig'
+    else:
+        opcoes = {'sep': ',', 'decimal': '.', 'date_format': '%Y-%m-%d'}
+        codificacao = 'utf-8'
+    
+    saida = _abrir_destino(destino)
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for secao in SECOES_DADOS:
+            tabela = relatorio[secao]['tabela']
+            with arquivo_zip.open(f"{secao}.csv", 'w', force_zip64=True) as f:
+                with io.TextIOWrapper(f, encoding=codificacao, newline='') as texto:
+                    for i, bloco in enumerate(func.dividir_em_blocos(tabela, tamanho_bloco)):
+                        _bloco_dados(bloco).to_csv(texto, header=i == 0, index=False, float_format='%.2f', **opcoes)
+    
+    if destino is None:
+        return saida.getvalue()
@@ -1,21 +1,96 @@
 import streamlit as st
+import hashlib
+import os
+import time
+import uuid
 import pandas as pd
 from datetime import datetime
-import funcoes_especificas as func
 import conciliacao as c
+import formatos
+import desempenho
+import tarefas
+
+# Cache da leitura dos arquivos: cada rerun do Streamlit reaproveita o DataFrame já tratado
+# A chave é o hash do conteúdo do arquivo + o tipo selecionado (banco ou controle)
+LIMITE_CACHE_ARQUIVOS = 4
+
+# Log JSON opcional das medições de desempenho (uma linha por conciliação)
+LOG_DESEMPENHO = os.environ.get("CONCILIACAO_LOG_DESEMPENHO")
+
+# Etapas medidas ao processar a conciliação, na ordem em que terminam
+ETAPAS_CONCILIACAO = ['conciliação', 'relatório', 'exportação Excel']
+
+# Intervalo (s) entre as consultas ao andamento da conciliação em segundo plano
+INTERVALO_ATUALIZACAO = 0.5
+
+# Formatos do relatório para download: formato de c.conciliacao, extensão e tipo MIME
+# Parquet e CSV trazem só as tabelas de dados (zip), sem a formatação do Excel
+FORMATOS_DOWNLOAD = {
+    "Excel": ('xlsx', 'xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": ('parquet', 'parquet.zip', "application/zip"),
+    "CSV": ('csv', 'csv.zip', "application/zip"),
+}
+
+def chave_arquivo(arquivo, tipo):
+    # O hash do conteúdo é calculado uma vez por upload (file_id) e guardado na sessão:
+    # a chave é pedida várias vezes a cada rerun, inclusive durante a conciliação
+    hashes = st.session_state.hashes_arquivos
+    if arquivo.file_id not in hashes:
+        hashes[arquivo.file_id] = hashlib.sha256(arquivo.getvalue()).hexdigest()
+        while len(hashes) > LIMITE_CACHE_ARQUIVOS:
+            hashes.pop(next(iter(hashes)))
+    return hashes[arquivo.file_id], tipo
+
+def carregar_arquivo(arquivo, tipo):
+    cache = st.session_state.cache_arquivos
+    chave = chave_arquivo(arquivo, tipo)
+    if chave not in cache:
+        registro = []
+        df = formatos.ler_arquivo_em_cache(arquivo, tipo, registro=registro, memoria=st.session_state.medir_memoria)
+        cache[chave] = {'df': df, 'desempenho': registro}
+        while len(cache) > LIMITE_CACHE_ARQUIVOS:
+            cache.pop(next(iter(cache)))
+    # Sem cópia: a conciliação não altera os DataFrames recebidos
+    return cache[chave]['df']
+
+def desempenho_arquivo(arquivo, tipo, lado):
+    # Medições da leitura do arquivo, identificadas pelo lado (extrato ou controle)
+    registro = st.session_state.cache_arquivos[chave_arquivo(arquivo, tipo)]['desempenho']
+    return [{**medicao, 'etapa': f"{medicao['etapa']} do {lado}"} for medicao in registro]
 
 # Inicializando as variáves de estado do extrato e do controle financeiro:
+# os DataFrames são refeitos a cada rerun a partir do cache dos arquivos enviados
 st.session_state.df_extrato = None
 st.session_state.df_controle = None
-st.session_state.excel = None
+if "cache_arquivos" not in st.session_state:
+    st.session_state.cache_arquivos = {}
+    st.session_state.hashes_arquivos = {}
+if "id_sessao" not in st.session_state:
+    # Identifica as tarefas em segundo plano desta sessão
+    st.session_state.id_sessao = uuid.uuid4().hex
+if "relatorio" not in st.session_state:
+    st.session_state.relatorio = None
+    st.session_state.desempenho = None
 
 # Tela Inicial
 st.title("Sistema CBA | Provalia")
 st.markdown("### Saldos Relacionados à conciliação:") 
 
-# ENTRADA DO SALDO
-saldo_inicial = st.number_input("Informe o saldo inicial (R$):")
+# ENTRADA DO SALDO E DA JANELA DE DATAS
+col_saldo, col_janela = st.columns(2)
+with col_saldo:
+    saldo_inicial = st.number_input("Informe o saldo inicial (R$):")
+with col_janela:
+    usar_janela = st.checkbox("Exigir datas próximas na conciliação")
+    janela_dias = st.number_input("Tolerância entre as datas (± dias):", min_value=0, value=3, step=1, disabled=not usar_janela)
+    agrupar = st.checkbox("Conciliar lançamentos agrupados (vários para um)")
+    desempate_texto = st.checkbox("Desempatar valores iguais pela descrição")
+    medir_memoria = st.checkbox("Medir o pico de memória de cada etapa (mais lento)")
 st.session_state.saldo_inicial = saldo_inicial
+st.session_state.janela_dias = int(janela_dias) if usar_janela else None
+st.session_state.agrupar = agrupar
+st.session_state.motor = "texto" if desempate_texto else "hash"
+st.session_state.medir_memoria = medir_memoria
 
 # UPLOAD DOS ARQUIVOS
 if st.session_state.df_extrato is None:
@@ -26,125 +101,19 @@ if st.session_state.df_extrato is None:
     # Campo de Seleção
     st.session_state.tipo_extrato = st.radio(
             "Selecione o banco emissor do extrato:",
-            ["SICOOB", "Banco do Brasil", "Extrato Padrão"]
-        )      
+            list(formatos.FORMATOS_EXTRATO)
+        )
     
-    # EXTRATO SICOOB
-    if st.session_state.tipo_extrato == "SICOOB":
-        # Upload do arquivo
-        extrato = st.file_uploader("Extrato extraído do SICOOB no formato Excel", type="xlsx")
-        
-        if extrato is not None:
-            try:
-                # Índices e organização inicial
-                indices_extrato = ["data", "documento", "descricao", "valor"]
-                df_extrato = pd.read_excel(extrato, engine="openpyxl", header=1)
-                df_extrato = df_extrato[["DATA", "DOCUMENTO", "HISTÓRICO", "VALOR"]]
-                df_extrato.columns = indices_extrato
-                df_extrato = func.agrupar_linhas_extrato(df_extrato)
-                df_extrato = func.ordernar_arquivo(df_extrato)
-                st.session_state['df_extrato'] = df_extrato # Salvando a primeira versão no sistema
-
-                # Tratamento dos dados
-                if "valor" in df_extrato.columns:
-                    df_extrato = func.remover_linhas_vazias(df_extrato)
-                    df_extrato = func.remover_linhas_desnecessarias(df_extrato)
-                    df_extrato["valor_convertido"] = df_extrato["valor"].apply(func.converter_valor_extrato)             
-                    df_extrato['valor_convertido'] = pd.to_numeric(df_extrato['valor_convertido'], errors='coerce')
-                    
-                    # Validação da Conversão de Valores
-                    valores_invalidos = df_extrato[df_extrato['valor_convertido'].isna()]
-                    if not valores_invalidos.empty:
-                        df_extrato = df_extrato.dropna(subset=['valor_convertido'])
-                    
-                    # Salvando o extrato no sistema
-                    st.session_state['df_extrato'] = df_extrato
-                    
-                else:
-                    st.error("Coluna 'valor' não encontrada no arquivo!")
-                    st.stop()
-                        
-            except Exception as e:
-                st.error(f"Erro ao processar arquivo: {e}")
+    # Upload do arquivo
+    formato_extrato = formatos.FORMATOS_EXTRATO[st.session_state.tipo_extrato]
+    extrato = st.file_uploader(formato_extrato['rotulo'], type="xlsx")
     
-    # EXTRATO BANCO DO BRASIL
-    elif st.session_state.tipo_extrato == "Banco do Brasil":
-        # Upload do arquivo
-        extrato = st.file_uploader("Extrato extraído do Banco do Brasil no formato Excel", type="xlsx")
-        
-        if extrato is not None:
-            try:
-                # Índices e organização inicial
-                indices_extrato = ["data", "documento", "descricao", "valor"]
-                df_extrato = pd.read_excel(extrato, engine="openpyxl", header=0)
-                df_extrato = df_extrato[["Data", "N° documento", "Lançamento", "Detalhes", "Valor"]]
-                df_extrato["Lançamento"] = df_extrato["Lançamento"].fillna('--') + " | " + df_extrato["Detalhes"].fillna('--')
-                df_extrato = df_extrato[["Data", "N° documento", "Lançamento", "Valor"]]
-                df_extrato.columns = indices_extrato
-                df_extrato = func.ordernar_arquivo(df_extrato)
-                st.session_state['df_extrato'] = df_extrato # Salvando a primeira versão no sistema
-                
-                # Tratamento dos dados
-                if "valor" in df_extrato.columns:
-                    df_extrato = func.remover_linhas_vazias(df_extrato)
-                    df_extrato = func.remover_linhas_desnecessarias(df_extrato)
-                    
-                    # Conversão do Valor para Número
-                    if pd.api.types.is_numeric_dtype(df_extrato["valor"]):
-                        df_extrato["valor_convertido"] = df_extrato["valor"]
-                    else:
-                        df_extrato["valor_convertido"] = df_extrato["valor"].astype(str).str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
-                        df_extrato["valor_convertido"] = pd.to_numeric(df_extrato["valor_convertido"],errors="coerce")
-                        
-                    # Salvando o extrato no sistema
-                    st.session_state['df_extrato'] = df_extrato
-                    
-                else:
-                    st.error("Coluna 'valor' não encontrada no arquivo!")
-                    st.stop()
-                        
-            except Exception as e:
-                st.error(f"Erro ao processar arquivo: {e}")
-                
-    # EXTRATO PADRÃO                
-    elif st.session_state.tipo_extrato == "Extrato Padrão":
-        # Upload do arquivo
-        extrato = st.file_uploader("Extrato no formato Excel padrão", type="xlsx")
-        
-        if extrato is not None:
-            try:
-                # Índices e organização inicial
-                indices_extrato = ["data", "documento", "descricao", "valor"]
-                df_extrato = pd.read_excel(extrato, engine="openpyxl", header=0)
-                df_extrato = df_extrato[["DATA", "DOCUMENTO", "DESCRIÇÃO", "INFORMAÇÕES ADICIONAIS", "VALOR"]]
-                df_extrato["DESCRIÇÃO"] = df_extrato["DESCRIÇÃO"].fillna('--') + ' | ' + df_extrato["INFORMAÇÕES ADICIONAIS"].fillna('--')
-                df_extrato = df_extrato[["DATA", "DOCUMENTO", "DESCRIÇÃO", "VALOR"]]
-                df_extrato.columns = indices_extrato
-                df_extrato = func.ordernar_arquivo(df_extrato)
-                st.session_state['df_extrato'] = df_extrato # Salvando a primeira versão no sistema
-
-                # Tratamento dos dados
-                if "valor" in df_extrato.columns:
-                    df_extrato = func.remover_linhas_vazias(df_extrato)
-                    df_extrato = func.remover_linhas_desnecessarias(df_extrato)
-                    df_extrato["valor_convertido"] = df_extrato["valor"]
-                    df_extrato['valor_convertido'] = pd.to_numeric(df_extrato['valor_convertido'], errors='coerce')
-                    
-                    # Validação da Conversão de Valores
-                    valores_invalidos = df_extrato[df_extrato['valor_convertido'].isna()]
-                    if not valores_invalidos.empty:
-                        df_extrato = df_extrato.dropna(subset=['valor_convertido']) 
-                    
-                    
-                    # Salvando o extrato no sistema
-                    st.session_state['df_extrato'] = df_extrato
-                    
-                else:
-                    st.error("Coluna 'valor' não encontrada no arquivo!")
-                    st.stop()
-                        
-            except Exception as e:
-                st.error(f"Erro ao processar arquivo: {e}")
+    if extrato is not None:
+        try:
+            # Salvando o extrato no sistema
+            st.session_state['df_extrato'] = carregar_arquivo(extrato, st.session_state.tipo_extrato)
+        except Exception as e:
+            st.error(f"Erro ao processar arquivo: {e}")
     
     # entrada do controle financeiro
     if st.session_state.df_extrato is not None:
@@ -153,93 +122,137 @@ if st.session_state.df_extrato is None:
         # Campo de Seleção
         st.session_state.tipo_controle = st.radio(
             "Selecione o tipo de Controle Financeiro:",
-            ["Controle Financeiro Perfarm", "Controle Financeiro Padrão"]
-        )      
+            list(formatos.FORMATOS_CONTROLE)
+        )
         
-        # CONTROLE PERFARM
-        if st.session_state.tipo_controle == "Controle Financeiro Perfarm":
-            # Upload do arquivo
-            controle_financeiro = st.file_uploader("Controle Financeiro extraído do sistema Perfarm no formato Excel", type="xlsx")
-            
-            if controle_financeiro is not None:
-                try: 
-                    # Índices e organização inicial
-                    indices_controle = ["data", "descricao", "contraparte", "plano de contas", "valor"]
-                    df_controle = pd.read_excel(controle_financeiro, engine="openpyxl", header=5)
-                    st.session_state['df_controle'] = df_controle
-                    df_controle = df_controle[["Data", "Recurso", "Contraparte", "Plano de Contas", "Valor"]]
-                    df_controle.columns = indices_controle
-                    st.session_state['df_controle'] = df_controle # Salvando a primeira versão no sistema
-                    
-                    #Tratamento dos dados
-                    df_controle = func.remover_linhas_vazias(df_controle)
-                    df_controle = func.remover_linhas_desnecessarias(df_controle, 'descricao')
-                    df_controle["valor_convertido"] = df_controle["valor"].apply(func.converter_valor_reais)
-                    
-                    # Validação da Conversão de Valores
-                    valores_invalidos = df_controle[df_controle['valor_convertido'].isna()]
-                    if not valores_invalidos.empty:
-                        df_controle = df_controle.dropna(subset=['valor_convertido'])
-                        
-                    # Salvando o controle financeiro no sistema
-                    st.session_state['df_controle'] = df_controle
-                    
-                except Exception as e:
-                    st.error(f"Erro ao processar arquivo: {e}")
-                    st.stop()
+        # Upload do arquivo
+        formato_controle = formatos.FORMATOS_CONTROLE[st.session_state.tipo_controle]
+        controle_financeiro = st.file_uploader(formato_controle['rotulo'], type="xlsx")
         
-        # CONTROLE PADRÃO
-        elif st.session_state.tipo_controle == "Controle Financeiro Padrão":
-            # Upload do arquivo
-            controle_financeiro = st.file_uploader("Controle Financeiro no formato Excel Padrão", type="xlsx")
-            
-            if controle_financeiro is not None:
-                try: 
-                    # Índices e organização inicial
-                    indices_controle = ["data", "descricao", "contraparte", "plano de contas", "valor"]
-                    df_controle = pd.read_excel(controle_financeiro, engine="openpyxl", header=0)
-                    st.session_state['df_controle'] = df_controle
-                    df_controle = df_controle[["Data", "Descrição", "Contraparte", "Plano de Contas", "Valor"]]
-                    df_controle.columns = indices_controle
-                    st.session_state['df_controle'] =df_controle # Salvando a primeira versão no sistema
-                    
-                    # Tratamento de dados
-                    df_controle = func.remover_linhas_vazias(df_controle)
-                    df_controle["valor_convertido"] = df_controle["valor"]
+        if controle_financeiro is not None:
+            try:
+                # Salvando o controle financeiro no sistema
+                st.session_state['df_controle'] = carregar_arquivo(controle_financeiro, st.session_state.tipo_controle)
+            except Exception as e:
+                st.error(f"Erro ao processar arquivo: {e}")
+                st.stop()
 
-                    # Salvando o controle financeiro no sistema
-                    st.session_state['df_controle'] = df_controle
-                    
-                except Exception as e:
-                    st.error(f"Erro ao processar arquivo: {e}")
-                    st.stop()
-        
-# PROCESSO DE CONCILIAÇÃO        
+# PROCESSO DE CONCILIAÇÃO
 if st.session_state.df_controle is not None:
-    if st.button("Processar Conciliação"):
-        barra_progresso = st.progress(0)
-        barra_progresso.progress(20)
-        
+    # Formato do arquivo gerado para download
+    col_formato, col_decimal = st.columns(2)
+    with col_formato:
+        formato_download = st.radio("Formato do relatório:", list(FORMATOS_DOWNLOAD), horizontal=True)
+    formato, extensao, mime = FORMATOS_DOWNLOAD[formato_download]
+    with col_decimal:
+        decimal_br = st.checkbox("CSV no padrão brasileiro (; e vírgula decimal)", disabled=formato != 'csv')
+    decimal_br = decimal_br and formato == 'csv'
+    
+    # Parâmetros da conciliação: o relatório só vale para os mesmos arquivos e opções
+    chave_conciliacao = (
+        chave_arquivo(extrato, st.session_state.tipo_extrato),
+        chave_arquivo(controle_financeiro, st.session_state.tipo_controle),
+        st.session_state.saldo_inicial,
+        st.session_state.janela_dias,
+        st.session_state.agrupar,
+        st.session_state.motor,
+        formato,
+        decimal_br,
+    )
+    # A conciliação roda em segundo plano, identificada pela sessão e pelos parâmetros:
+    # cada rerun da sessão reencontra a tarefa em andamento, sem refazê-la
+    chave_tarefa = (st.session_state.id_sessao, chave_conciliacao)
+    tarefa = tarefas.obter(chave_tarefa)
+    
+    # O relatório recolhido fica na sessão enquanto os arquivos e as opções forem os mesmos
+    if st.session_state.relatorio is not None and st.session_state.relatorio['chave'] != chave_conciliacao:
+        st.session_state.relatorio = None
+        st.session_state.desempenho = None
+    
+    em_andamento = tarefa is not None and tarefa['estado'] in tarefas.ESTADOS_ATIVOS
+    if st.button("Processar Conciliação", disabled=em_andamento):
         # CHAMADA DA FUNÇÃO
-        excel_bytes = c.conciliacao(st.session_state.df_extrato, st.session_state.df_controle, st.session_state.saldo_inicial)
-        
-        barra_progresso.progress(50)
-        
+        tarefa = tarefas.iniciar(chave_tarefa, c.conciliacao, st.session_state.df_extrato, st.session_state.df_controle, st.session_state.saldo_inicial, st.session_state.janela_dias, st.session_state.agrupar, st.session_state.motor, memoria=st.session_state.medir_memoria, formato=formato, decimal_br=decimal_br)
+        st.session_state.relatorio = None
+        st.session_state.desempenho = None
+    
+    if tarefa is not None and tarefa['estado'] in tarefas.ESTADOS_ATIVOS:
+        # A barra avança a cada etapa concluída; a tela é atualizada até a tarefa terminar
+        concluidas = list(tarefa['registro'])
+        if tarefa['cancelar'].is_set():
+            texto = "Cancelando..."
+        elif concluidas:
+            texto = f"{concluidas[-1]['etapa'].capitalize()} concluída em {concluidas[-1]['segundos']:.2f} s"
+        elif tarefa['estado'] == tarefas.NA_FILA:
+            texto = "Aguardando na fila..."
+        else:
+            texto = "Conciliando..."
+        st.progress(min(len(concluidas) / len(ETAPAS_CONCILIACAO), 1.0), text=texto)
+        if st.button("Cancelar conciliação"):
+            tarefas.cancelar(chave_tarefa)
+        time.sleep(INTERVALO_ATUALIZACAO)
+        st.rerun()
+    elif tarefa is not None:
+        # Tarefa encerrada: sai do registro e o resultado passa para a sessão
+        tarefas.recolher(chave_tarefa)
+    
+    if tarefa is not None and tarefa['estado'] == tarefas.CONCLUIDA:
         # SALVANDO O RESULTADO DA CONCILIAÇÃO NO SISTEMA
-        st.session_state.excel = excel_bytes
+        st.session_state.relatorio = {
+            'chave': chave_conciliacao,
+            'dados': tarefa['resultado'],
+            'rotulo': formato_download,
+            'extensao': extensao,
+            'mime': mime,
+            'avisos': list(tarefa['avisos']),
+        }
         
-        barra_progresso.progress(70)
+        # Medições da leitura dos arquivos + etapas da conciliação
+        st.session_state.desempenho = (
+            desempenho_arquivo(extrato, st.session_state.tipo_extrato, 'extrato')
+            + desempenho_arquivo(controle_financeiro, st.session_state.tipo_controle, 'controle')
+            + tarefa['registro']
+        )
+        if LOG_DESEMPENHO:
+            desempenho.salvar_log(
+                st.session_state.desempenho,
+                LOG_DESEMPENHO,
+                formato_extrato=st.session_state.tipo_extrato,
+                formato_controle=st.session_state.tipo_controle,
+                motor=st.session_state.motor,
+            )
+    elif tarefa is not None and tarefa['estado'] == tarefas.CANCELADA:
+        st.warning("Conciliação cancelada.")
+    elif tarefa is not None and tarefa['estado'] == tarefas.ERRO:
+        st.error(f"Erro na conciliação: {tarefa['erro']}")
+else:
+    st.session_state.relatorio = None
+    st.session_state.desempenho = None
 
-# DOWNLOAD DO RELATÓRIO        
-if st.session_state.excel is not None:
-    barra_progresso.progress(100)
+# DOWNLOAD DO RELATÓRIO
+if st.session_state.relatorio is not None:
+    # Avisos da conciliação (ex.: agrupamento interrompido pelo limite de tempo)
+    for aviso in st.session_state.relatorio['avisos']:
+        st.warning(aviso)
     st.download_button(
-        label="📥 Baixar Relatório Excel",
-        data=excel_bytes,
-        file_name=f"relatorio_conciliação_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        label=f"📥 Baixar Relatório {st.session_state.relatorio['rotulo']}",
+        data=st.session_state.relatorio['dados'],
+        file_name=f"relatorio_conciliação_{datetime.now().strftime('%Y%m%d_%H%M')}.{st.session_state.relatorio['extensao']}",
+        mime=st.session_state.relatorio['mime']
     )
-            
-        
+
+# PAINEL DE DESEMPENHO
+if st.session_state.desempenho:
+    with st.expander("Desempenho"):
+        tabela_desempenho = pd.DataFrame(st.session_state.desempenho)
+        st.dataframe(tabela_desempenho, hide_index=True)
+        st.caption(f"Tempo total: {tabela_desempenho['segundos'].sum():.2f} s")
         
-        
\ No newline at end of file
+        # Linhas removidas por regra do filtro, em cada arquivo
+        linhas_removidas = pd.DataFrame({
+            'extrato': st.session_state.df_extrato.attrs.get('linhas_removidas', {}),
+            'controle': st.session_state.df_controle.attrs.get('linhas_removidas', {}),
+        })
+        if not linhas_removidas.empty:
+            st.markdown("Linhas removidas pelo filtro")
+            st.dataframe(linhas_removidas.fillna(0).astype(int).rename_axis("Regra"))
@@ -0,0 +1,203 @@
+"""
+Conciliações em segundo plano
+
+A conciliação roda numa thread do processo do app, fora do ciclo de execução do
+Streamlit: a tela consulta o andamento da tarefa a cada rerun, pode cancelá-la e
+recolhe o resultado quando ela termina. As tarefas ficam num registro do processo,
+identificadas por uma chave (sessão + arquivos + opções): cada rerun da sessão
+reencontra a tarefa em andamento. Encerrada, a tarefa é recolhida pela tela e sai
+do registro, que assim não acumula os relatórios gerados; as encerradas que não
+forem recolhidas (sessão fechada no meio da conciliação) são descartadas acima de
+um limite.
+
+O cancelamento é cooperativo: a tarefa para na próxima etapa concluída
+(conciliação, relatório, exportação), ou nem começa se ainda estiver na fila.
+Uma tarefa cancelada não grava nada no livro de pendências: a baixa dos pares só
+acontece depois da exportação (ver conciliacao.conciliacao).
+
+A medição de memória (tracemalloc) é global no processo e registra as alocações de
+todas as threads: uma tarefa que mede memória executa sozinha, esperando as outras
+terminarem, e nenhuma outra começa enquanto ela executa.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Conciliações executadas ao mesmo tempo; as demais esperam na fila
+MAX_TAREFAS_SIMULTANEAS = 2
+
+# Tarefas encerradas e ainda não recolhidas mantidas no registro (com o resultado)
+LIMITE_TAREFAS_ENCERRADAS = 8
+
+NA_FILA = 'na fila'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluída'
+CANCELADA = 'cancelada'
+ERRO = 'erro'
+ESTADOS_ATIVOS = (NA_FILA, EXECUTANDO)
+
+# Intervalo (s) entre as verificações de cancelamento de uma tarefa esperando a vez
+INTERVALO_ESPERA = 0.5
+
+_executor = ThreadPoolExecutor(max_workers=MAX_TAREFAS_SIMULTANEAS, thread_name_prefix='conciliacao')
+_tarefas = {}
+_trava = threading.Lock()
+
+# Controle de execução exclusiva das tarefas que medem memória
+_vez = threading.Condition()
+_vez_estado = {'executando': 0, 'medindo_memoria': False, 'memoria_esperando': 0}
+
+
+class TarefaCancelada(Exception):
+    """Interrompe, entre duas etapas, a execução de uma tarefa cancelada"""
+
+
+def _aguardar_vez(tarefa, memoria):
+    """
+    Espera a vez de executar: uma tarefa com medição de memória espera todas as
+    outras terminarem; as demais esperam enquanto alguma mede memória (ou aguarda
+    para medir, para que ela não fique esperando indefinidamente)
+
+    Returns:
+        bool: False se a tarefa foi cancelada durante a espera
+    """
+    estado = _vez_estado
+    if memoria:
+        livre = lambda: estado['executando'] == 0 and not estado['medindo_memoria']
+    else:
+        livre = lambda: not estado['medindo_memoria'] and estado['memoria_esperando'] == 0
+    with _vez:
+        if memoria:
+            estado['memoria_esperando'] += 1
+        try:
+            while not livre():
+                if tarefa['cancelar'].is_set():
+                    return False
+                _vez.wait(INTERVALO_ESPERA)
+        finally:
+            if memoria:
+                estado['memoria_esperando'] -= 1
+                _vez.notify_all()
+        if memoria:
+            estado['medindo_memoria'] = True
+        else:
+            estado['executando'] += 1
+        return True
+
+
+def _liberar_vez(memoria):
+    with _vez:
+        if memoria:
+            _vez_estado['medindo_memoria'] = False
+        else:
+            _vez_estado['executando'] -= 1
+        _vez.notify_all()
+
+
+def _executar(tarefa, funcao, args, kwargs):
+    """Executa a função da tarefa, registrando o andamento, o resultado ou o erro"""
+    memoria = bool(kwargs.get('memoria'))
+    if tarefa['cancelar'].is_set() or not _aguardar_vez(tarefa, memoria):
+        tarefa['estado'] = CANCELADA
+        return
+
+    def etapa_concluida(medicao):
+        if tarefa['cancelar'].is_set():
+            raise TarefaCancelada()
+
+    tarefa['estado'] = EXECUTANDO
+    tarefa['inicio'] = time.time()
+    try:
+        tarefa['resultado'] = funcao(*args, registro=tarefa['registro'], ao_concluir=etapa_concluida,
+                                     avisos=tarefa['avisos'], **kwargs)
+        tarefa['estado'] = CONCLUIDA
+    except TarefaCancelada:
+        tarefa['estado'] = CANCELADA
+    except Exception as e:
+        tarefa['erro'] = f"{type(e).__name__}: {e}"
+        tarefa['estado'] = ERRO
+    finally:
+        tarefa['fim'] = time.time()
+        _liberar_vez(memoria)
+        with _trava:
+            _limpar_encerradas()
+
+
+def _limpar_encerradas():
+    """Descarta as tarefas encerradas mais antigas acima do limite (com a trava)"""
+    encerradas = [chave for chave, tarefa in _tarefas.items() if tarefa['estado'] not in ESTADOS_ATIVOS]
+    for chave in encerradas[:max(len(encerradas) - LIMITE_TAREFAS_ENCERRADAS, 0)]:
+        del _tarefas[chave]
+
+
+def iniciar(chave, funcao, *args, **kwargs):
+    """
+    Inicia a tarefa em segundo plano, ou devolve a existente com a mesma chave
+    (em andamento ou concluída); tarefas canceladas ou com erro são refeitas
+
+    Args:
+        chave: identificação da tarefa (hashable)
+        funcao: função executada; recebe registro e ao_concluir (desempenho.medir)
+            e a lista de avisos, além de *args e **kwargs, como conciliacao.conciliacao
+
+    Returns:
+        dict da tarefa: estado, registro (etapas concluídas), avisos, resultado, erro
+    """
+    with _trava:
+        tarefa = _tarefas.get(chave)
+        if tarefa is not None and tarefa['estado'] not in (CANCELADA, ERRO):
+            return tarefa
+
+        tarefa = {
+            'chave': chave,
+            'estado': NA_FILA,
+            'registro': [],
+            'avisos': [],
+            'resultado': None,
+            'erro': None,
+            'cancelar': threading.Event(),
+            'criada': time.time(),
+            'inicio': None,
+            'fim': None,
+        }
+        _tarefas.pop(chave, None)
+        _tarefas[chave] = tarefa
+        _limpar_encerradas()
+        tarefa['futuro'] = _executor.submit(_executar, tarefa, funcao, args, kwargs)
+        return tarefa
+
+
+def obter(chave):
+    """Tarefa com a chave informada, ou None"""
+    with _trava:
+        return _tarefas.get(chave)
+
+
+def recolher(chave):
+    """
+    Retira do registro a tarefa encerrada (concluída, cancelada ou com erro) e a
+    devolve, para que o resultado passe para quem a iniciou
+
+    Returns:
+        dict da tarefa, ou None se não existir ou ainda estiver em andamento
+    """
+    with _trava:
+        tarefa = _tarefas.get(chave)
+        if tarefa is None or tarefa['estado'] in ESTADOS_ATIVOS:
+            return None
+        return _tarefas.pop(chave)
+
+
+def cancelar(chave):
+    """
+    Pede o cancelamento da tarefa: se ainda estiver na fila, não chega a executar;
+    se estiver executando, para ao fim da etapa atual
+    """
+    with _trava:
+        tarefa = _tarefas.get(chave)
+    if tarefa is None or tarefa['estado'] not in ESTADOS_ATIVOS:
+        return
+    tarefa['cancelar'].set()
+    if tarefa['futuro'].cancel():
+        tarefa['estado'] = CANCELADA
+